@@ -0,0 +1,16 @@
+from argparse import ArgumentParser
+
+from lib.tools.apply_patch import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--old", required=True)
+    parser.add_argument("--patch", required=True)
+    parser.add_argument("--archive", required=True)
+    parser.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()
@@ -0,0 +1,14 @@
+from argparse import ArgumentParser
+
+from lib.tools.benchmark_crilayla import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()
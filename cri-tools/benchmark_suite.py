@@ -0,0 +1,23 @@
+from argparse import ArgumentParser
+
+from lib.tools.benchmark_suite import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-rows", type=int, default=1000000)
+    parser.add_argument("--small-files", type=int, default=4000)
+    parser.add_argument("--small-size", type=int, default=16 * 1024)
+    parser.add_argument("--movie-files", type=int, default=2)
+    parser.add_argument("--movie-size", type=int, default=64 * 1024 * 1024)
+    parser.add_argument("--work-directory")
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,21 @@
+from argparse import ArgumentParser
+import os
+
+from lib.tools.build_archives import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--specs", required=True)
+    parser.add_argument("--parallel", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--memory-budget", type=int, default=512 * 1024 * 1024)
+    parser.add_argument("--direct-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--compression-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--metrics")
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,4 +1,5 @@
 from argparse import ArgumentParser
+import os
 
 from lib.tools.create_archive import run
 
@@ -7,8 +8,20 @@ def _main():
     parser = ArgumentParser()
     parser.add_argument("--directory", required=True)
     parser.add_argument("--archive", required=True)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--memory-budget", type=int, default=256 * 1024 * 1024)
+    parser.add_argument("--direct-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--compression-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--metrics")
+    parser.add_argument("--no-progress", dest="progress", action="store_false")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--base")
     args = parser.parse_args()
     run(**vars(args))
 
 
-_main()
+if __name__ == "__main__":
+    _main()
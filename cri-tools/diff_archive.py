@@ -0,0 +1,15 @@
+from argparse import ArgumentParser
+
+from lib.tools.diff_archive import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--old", required=True)
+    parser.add_argument("--new", required=True)
+    parser.add_argument("--patch", required=True)
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()
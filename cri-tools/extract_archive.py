@@ -0,0 +1,15 @@
+from argparse import ArgumentParser
+
+from lib.tools.extract_archive import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--archive", required=True)
+    parser.add_argument("--directory", required=True)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()
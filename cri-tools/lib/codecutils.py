@@ -1,5 +1,8 @@
-from typing import BinaryIO
+from array import array
+from functools import lru_cache
 import struct
+import sys
+from typing import Any, BinaryIO
 
 
 def write_bytes(fp: BinaryIO, value: bytes) -> None:
@@ -69,3 +72,85 @@ def read_any_be_f4(fp: BinaryIO) -> None:
 
 def read_any_be_f8(fp: BinaryIO) -> None:
     return struct.unpack(">d", read_any_bytes(fp, 8))[0]
+
+
+@lru_cache(maxsize=256)
+def _struct(fmt: str) -> struct.Struct:
+    return struct.Struct(fmt)
+
+
+class BinaryWriter:
+    def __init__(self, capacity: int = 256):
+        self._buffer = bytearray(max(capacity, 16))
+        self.position = 0
+
+    def pack(self, fmt: str, *values: Any) -> None:
+        codec = _struct(fmt)
+        start = self.position
+        self.position = end = start + codec.size
+        if end > len(self._buffer):
+            self._grow(end)
+        codec.pack_into(self._buffer, start, *values)
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        start = self.position
+        self.position = end = start + len(data)
+        if end > len(self._buffer):
+            self._grow(end)
+        self._buffer[start:end] = data
+
+    def zeros(self, size: int) -> None:
+        self.position += size
+        if self.position > len(self._buffer):
+            self._grow(self.position)
+
+    def reserve(self, fmt: str) -> int:
+        start = self.position
+        self.zeros(_struct(fmt).size)
+        return start
+
+    def patch(self, offset: int, fmt: str, *values: Any) -> None:
+        _struct(fmt).pack_into(self._buffer, offset, *values)
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer[: self.position])
+
+    def _grow(self, size: int) -> None:
+        capacity = max(size, 2 * len(self._buffer))
+        self._buffer.extend(bytes(capacity - len(self._buffer)))
+
+
+class BinaryReader:
+    def __init__(self, data: bytes | bytearray | memoryview, position: int = 0):
+        self._view = memoryview(data)
+        self.position = position
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def unpack(self, fmt: str) -> tuple[Any, ...]:
+        codec = _struct(fmt)
+        return codec.unpack_from(self._view, self._advance(codec.size))
+
+    def read(self, size: int) -> memoryview:
+        start = self._advance(size)
+        return self._view[start : self.position]
+
+    def expect(self, expected: bytes) -> None:
+        actual = bytes(self.read(len(expected)))
+        if actual != expected:
+            raise ValueError(f"expected {expected!r}, got {actual!r}")
+
+    def read_array(self, typecode: str, count: int, byteorder: str = "big") -> array:
+        values = array(typecode)
+        values.frombytes(self.read(values.itemsize * count))
+        if byteorder != sys.byteorder and values.itemsize > 1:
+            values.byteswap()
+        return values
+
+    def _advance(self, size: int) -> int:
+        start = self.position
+        if size < 0 or start + size > len(self._view):
+            raise EOFError
+        self.position = start + size
+        return start
@@ -0,0 +1,49 @@
+from functools import lru_cache
+import zlib
+
+_polynomial = 0xEDB88320
+
+
+def _times(matrix: tuple[int, ...], vector: int) -> int:
+    value = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            value ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return value
+
+
+def _compose(a: tuple[int, ...], b: tuple[int, ...]) -> tuple[int, ...]:
+    return tuple(_times(a, column) for column in b)
+
+
+@lru_cache(maxsize=64)
+def _zeros_operator(length: int) -> tuple[int, ...]:
+    power = (_polynomial,) + tuple(1 << n for n in range(31))
+    for _ in range(3):
+        power = _compose(power, power)
+    result = tuple(1 << n for n in range(32))
+    while length:
+        if length & 1:
+            result = _compose(power, result)
+        length >>= 1
+        if length:
+            power = _compose(power, power)
+    return result
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    if length2 <= 0:
+        return crc1
+    return _times(_zeros_operator(length2), crc1) ^ crc2
+
+
+def crc32_file(path: str) -> int:
+    crc = 0
+    buffer = memoryview(bytearray(1024 * 1024))
+    with open(path, "rb") as f:
+        while n := f.readinto(buffer):
+            crc = zlib.crc32(buffer[:n], crc)
+    return crc
@@ -1,20 +1,38 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Sequence
 from dataclasses import dataclass
+from functools import cached_property
+import io
+import mmap
 import os
-from shutil import copyfileobj
-from typing import BinaryIO
+import stat
+from threading import Lock
+from time import perf_counter
+from typing import Any, BinaryIO, Callable
+import zlib
 
 from lib.codecutils import (
+    BinaryReader,
+    BinaryWriter,
     write_bytes,
-    write_le_u,
 )
+from lib.cri.crilayla import decompress, decompress_into, decompress_to_file
+from lib.cri.crypt import crypt
+from lib.cri.padding import Padder
 from lib.cri.table import (
     Column,
     Kind,
     Spec,
     CharsEncoding,
     Table,
+    LazyTable,
+    ColumnarTable,
     encode as encode_table,
+    decode_lazy as decode_lazy_table,
 )
+from lib.metrics import Metrics, phase
 
 
 @dataclass(frozen=True)
@@ -22,6 +40,43 @@ class Config:
     alignment: int
     encrypt_tables: bool
     randomize_padding: bool
+    dedupe_tables: bool = True
+    share_string_suffixes: bool = False
+    deduplicate_entries: bool = False
+    file_crcs: bool = False
+    padding_seed: int | None = None
+
+
+@dataclass(frozen=True)
+class FileReport:
+    id_: int
+    name: str
+    offset: int
+    size: int
+    extract_size: int
+    method: str
+    crc: int | None = None
+
+
+@dataclass(frozen=True)
+class PlannedFile:
+    id_: int
+    name: str
+    offset: int
+    size: int
+    extract_size: int
+    duplicate: bool
+    crc: int | None = None
+
+
+@dataclass(frozen=True)
+class Entry:
+    id_: int
+    name: str
+    offset: int
+    size: int
+    extract_size: int
+    crc: int | None = None
 
 
 _header_spec = Spec(
@@ -89,6 +144,12 @@ _toc_info_spec = Spec(
     string_encoding=CharsEncoding.CP932,
 )
 
+_toc_info_crc_spec = Spec(
+    name=_toc_info_spec.name,
+    columns=_toc_info_spec.columns + (Column("CRC", Kind.U4),),
+    string_encoding=_toc_info_spec.string_encoding,
+)
+
 _extend_id_spec = Spec(
     name="CpkExtendId",
     columns=(
@@ -103,14 +164,10 @@ _body_offset = 2048
 _format_version = 7
 _format_revision = 14
 
+_copy_buffer_size = 8 * 1024 * 1024
 
-def _crypt(data: bytes) -> bytes:
-    buffer = bytearray(data)
-    key = 0x5F
-    for i in range(len(data)):
-        buffer[i] ^= key
-        key = (key * 0x15) & 0xFF
-    return bytes(buffer)
+_block_size = 64 * 1024
+_cache_size = 16 * 1024 * 1024
 
 
 @dataclass(frozen=True)
@@ -119,100 +176,606 @@ class _InternalTocEntry:
     name: str
     offset: int
     size: int
+    extract_size: int
+    crc: int | None = None
 
 
-@dataclass(frozen=True)
-class _InternalItocEntry:
-    id_: int
-    index: int
+class _InternalToc:
+    __slots__ = ("ids", "names", "offsets", "sizes", "extract_sizes", "crcs")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.names = []
+        self.offsets = array("Q")
+        self.sizes = array("Q")
+        self.extract_sizes = array("Q")
+        self.crcs = array("I")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(
+        self,
+        id_: int,
+        name: str,
+        offset: int,
+        size: int,
+        extract_size: int,
+        crc: int | None,
+    ) -> None:
+        self.ids.append(id_)
+        self.names.append(name)
+        self.offsets.append(offset)
+        self.sizes.append(size)
+        self.extract_sizes.append(extract_size)
+        self.crcs.append(crc or 0)
+
+    def pop(self, name: str) -> _InternalTocEntry:
+        try:
+            i = self.names.index(name)
+        except ValueError:
+            raise KeyError(name) from None
+        return _InternalTocEntry(
+            id_=self.ids.pop(i),
+            name=self.names.pop(i),
+            offset=self.offsets.pop(i),
+            size=self.sizes.pop(i),
+            extract_size=self.extract_sizes.pop(i),
+            crc=self.crcs.pop(i),
+        )
 
 
 class Writer:
-    def __init__(self, fp: BinaryIO, config: Config):
+    def __init__(
+        self,
+        fp: BinaryIO,
+        config: Config,
+        metrics: Metrics | None = None,
+        on_file: Callable[[FileReport], None] | None = None,
+    ):
         self._fp = fp
         self._config = config
+        self._metrics = metrics
+        self._on_file = on_file
 
+        self._internal_toc = _InternalToc()
         self._ids = set()
         self._names = set()
-
-        self._internal_toc = []
+        self._digests = {}
+        self._crcs = {}
+        self.deduplicated_size = 0
+        self.padding = Padder(
+            config.randomize_padding, config.padding_seed, reserved=_body_offset
+        )
+        self._file_end = self._fp.seek(0, os.SEEK_END)
         self._fp.seek(_body_offset)
         self._align()
         self._content_offset = self._fp.tell()
 
-    def write_file(self, id_: int, name: str, fp: BinaryIO) -> None:
+    def write_file(
+        self,
+        id_: int,
+        name: str,
+        fp: BinaryIO,
+        digest: str | None = None,
+        extract_size: int | None = None,
+    ) -> FileReport:
+        return self._write(
+            id_,
+            name,
+            digest,
+            extract_size,
+            lambda: _remaining_size(fp),
+            lambda: _copy_file(fp, self._fp, self._config.file_crcs),
+        )
+
+    def copy_file(
+        self,
+        id_: int,
+        name: str,
+        src: BinaryIO,
+        src_offset: int,
+        size: int,
+        digest: str | None = None,
+        extract_size: int | None = None,
+        crc: int | None = None,
+    ) -> FileReport:
+        return self._write(
+            id_,
+            name,
+            digest,
+            extract_size,
+            lambda: size,
+            lambda: _copy_file_range(
+                src, src_offset, self._fp, size, self._config.file_crcs, crc
+            ),
+        )
+
+    def _write(
+        self,
+        id_: int,
+        name: str,
+        digest: str | None,
+        extract_size: int | None,
+        get_size: Callable[[], int],
+        copy: Callable[[], tuple[str, int, int | None]],
+    ) -> FileReport:
+        self._claim(id_, name)
+        start = perf_counter()
+        key = None
+        offset = None
+        if self._config.deduplicate_entries and digest is not None:
+            size = get_size()
+            key = (digest, size, size if extract_size is None else extract_size)
+            offset = self._digests.get(key)
+        if offset is not None:
+            method = "duplicate"
+            crc = self._crcs.get(key)
+            self.deduplicated_size += size
+        else:
+            self._align()
+            start = perf_counter()
+            offset = self._fp.tell()
+            method, size, crc = copy()
+            if key is not None:
+                self._digests[key] = offset
+                self._crcs[key] = crc
+
+        self._internal_toc.append(
+            id_, name, offset, size, size if extract_size is None else extract_size, crc
+        )
+        report = FileReport(
+            id_=id_,
+            name=name,
+            offset=offset,
+            size=size,
+            extract_size=size if extract_size is None else extract_size,
+            method=method,
+            crc=crc,
+        )
+        _notify(self._metrics, self._on_file, report, perf_counter() - start)
+        return report
+
+    def close(self) -> None:
+        content_size = self._fp.tell() - self._content_offset
+        tables = _build_tables(
+            self._config,
+            self._internal_toc,
+            self._content_offset,
+            content_size,
+            self._metrics,
+        )
+        self._pad(tables.toc_offset - self._fp.tell())
+        write_bytes(self._fp, tables.toc)
+        self._pad(tables.itoc_offset - self._fp.tell())
+        write_bytes(self._fp, tables.itoc)
+        self._fp.truncate()
+
+        self._fp.seek(0)
+        write_bytes(self._fp, tables.header)
+        self._pad(_body_offset - self._fp.tell())
+
+    def _claim(self, id_: int, name: str) -> None:
         if id_ in self._ids:
             raise ValueError(f"duplicate id: {id_!r}")
-        self._ids.add(id_)
-
         if name in self._names:
             raise ValueError(f"duplicate name: {name!r}")
+        self._ids.add(id_)
         self._names.add(name)
 
-        self._align()
-        offset = self._fp.tell()
-        copyfileobj(fp, self._fp)
-        size = self._fp.tell() - offset
+    def _align(self) -> None:
+        self._pad(-self._fp.tell() % self._config.alignment)
 
-        self._internal_toc.append(
-            _InternalTocEntry(
-                id_=id_,
-                name=name,
-                offset=offset,
-                size=size,
+    def _pad(self, size: int) -> None:
+        with phase(self._metrics, "pad", size):
+            position = self._fp.tell()
+            self.padding.pad(self._fp, position, size, max(self._file_end, position))
+
+
+class Updater(Writer):
+    def __init__(
+        self,
+        fp: BinaryIO,
+        config: Config,
+        digests: dict[str, str] | None = None,
+        metrics: Metrics | None = None,
+        on_file: Callable[[FileReport], None] | None = None,
+    ):
+        self._fp = fp
+        self._config = config
+        self._metrics = metrics
+        self._on_file = on_file
+        self.deduplicated_size = 0
+        self.padding = Padder(
+            config.randomize_padding, config.padding_seed, reserved=_body_offset
+        )
+        self._file_end = self._fp.seek(0, os.SEEK_END)
+
+        reader = Reader(fp)
+        try:
+            self.entries = reader.entries
+            content_offset = reader.header["ContentOffset"]
+            content_end = content_offset + reader.header["ContentSize"]
+        finally:
+            reader.close()
+
+        self._internal_toc = _InternalToc()
+        self._ids = {entry.id_ for entry in self.entries}
+        self._names = {entry.name for entry in self.entries}
+        for entry in self.entries:
+            self._internal_toc.append(
+                entry.id_,
+                entry.name,
+                entry.offset,
+                entry.size,
+                entry.extract_size,
+                entry.crc,
             )
+        if config.file_crcs and any(entry.crc is None for entry in self.entries):
+            raise ValueError("archive has no file CRCs")
+        self._digests = {}
+        self._crcs = {}
+        for entry in self.entries:
+            digest = (digests or {}).get(entry.name)
+            if digest is not None:
+                key = (digest, entry.size, entry.extract_size)
+                self._digests[key] = entry.offset
+                self._crcs[key] = entry.crc
+        self._content_offset = content_offset
+        self._content_end = content_end
+        self._fp.seek(self._content_end)
+
+    def _write(
+        self,
+        id_: int,
+        name: str,
+        digest: str | None,
+        extract_size: int | None,
+        get_size: Callable[[], int],
+        copy: Callable[[], tuple[str, int, int | None]],
+    ) -> FileReport:
+        self._fp.seek(self._content_end)
+        report = super()._write(id_, name, digest, extract_size, get_size, copy)
+        self._content_end = max(self._content_end, self._fp.tell())
+        self._file_end = max(self._file_end, self._content_end)
+        return report
+
+    def update_file(
+        self,
+        id_: int,
+        name: str,
+        fp: BinaryIO,
+        digest: str | None = None,
+        extract_size: int | None = None,
+    ) -> FileReport:
+        entry = self._internal_toc.pop(name)
+        self._ids.discard(entry.id_)
+        self._names.discard(entry.name)
+        slot_end = self._slot_end(entry)
+        size = _remaining_size(fp)
+        if extract_size is None:
+            extract_size = size
+        if entry.offset + size > slot_end or (
+            self._config.deduplicate_entries
+            and (digest, size, extract_size) in self._digests
+        ):
+            return self.write_file(id_, name, fp, digest, extract_size)
+
+        self._claim(id_, name)
+        start = perf_counter()
+        self._digests = {
+            key: offset
+            for key, offset in self._digests.items()
+            if offset != entry.offset
+        }
+        self._fp.seek(entry.offset)
+        method, size, crc = _copy_file(fp, self._fp, self._config.file_crcs)
+        self._align()
+        if digest is not None:
+            self._digests[(digest, size, extract_size)] = entry.offset
+            self._crcs[(digest, size, extract_size)] = crc
+        self._internal_toc.append(id_, name, entry.offset, size, extract_size, crc)
+        self._fp.seek(self._content_end)
+        report = FileReport(
+            id_=id_,
+            name=name,
+            offset=entry.offset,
+            size=size,
+            extract_size=extract_size,
+            method=method,
+            crc=crc,
         )
+        _notify(self._metrics, self._on_file, report, perf_counter() - start)
+        return report
+
+    def remove_file(self, name: str) -> None:
+        entry = self._internal_toc.pop(name)
+        self._ids.discard(entry.id_)
+        self._names.discard(entry.name)
 
     def close(self) -> None:
-        total_size = 0
-        self._internal_toc.sort(key=lambda x: x.name)
-        internal_itoc = []
-        toc = []
-        for entry in self._internal_toc:
-            total_size += entry.size
-            internal_itoc.append(
-                _InternalItocEntry(
-                    id_=entry.id_,
-                    index=len(toc),
-                )
+        self._fp.seek(self._content_end)
+        super().close()
+
+    def _slot_end(self, entry: _InternalTocEntry) -> int:
+        slot_end = entry.offset + entry.size
+        slot_end += -slot_end % self._config.alignment
+        slot_end = min(slot_end, self._content_end)
+        for offset, size in zip(self._internal_toc.offsets, self._internal_toc.sizes):
+            if size == 0:
+                continue
+            if offset == entry.offset:
+                return entry.offset
+            if entry.offset < offset < slot_end:
+                slot_end = offset
+        return slot_end
+
+
+@dataclass(frozen=True)
+class _Tables:
+    header: bytes
+    toc_offset: int
+    toc: bytes
+    itoc_offset: int
+    itoc: bytes
+
+
+@dataclass(frozen=True)
+class Plan:
+    files: tuple[PlannedFile, ...]
+    content_offset: int
+    content_size: int
+    tables: _Tables
+
+    @property
+    def file_size(self) -> int:
+        return self.tables.itoc_offset + len(self.tables.itoc)
+
+
+class Planner:
+    def __init__(self, config: Config, metrics: Metrics | None = None):
+        self._config = config
+        self._metrics = metrics
+
+        self._files = []
+        self._digests = {}
+        self.deduplicated_size = 0
+        self._content_offset = _align_offset(_body_offset, config.alignment)
+        self._content_end = self._content_offset
+
+    def add_file(
+        self,
+        id_: int,
+        name: str,
+        size: int,
+        digest: str | None = None,
+        extract_size: int | None = None,
+        crc: int | None = None,
+    ) -> PlannedFile:
+        if extract_size is None:
+            extract_size = size
+        key = None
+        offset = None
+        if self._config.deduplicate_entries and digest is not None:
+            key = (digest, size, extract_size)
+            offset = self._digests.get(key)
+        duplicate = offset is not None
+        if duplicate:
+            self.deduplicated_size += size
+        else:
+            offset = _align_offset(self._content_end, self._config.alignment)
+            self._content_end = offset + size
+            if key is not None:
+                self._digests[key] = offset
+
+        planned = PlannedFile(
+            id_=id_,
+            name=name,
+            offset=offset,
+            size=size,
+            extract_size=extract_size,
+            duplicate=duplicate,
+            crc=crc,
+        )
+        self._files.append(planned)
+        return planned
+
+    def finish(self) -> Plan:
+        internal_toc = _InternalToc()
+        for planned in self._files:
+            internal_toc.append(
+                planned.id_,
+                planned.name,
+                planned.offset,
+                planned.size,
+                planned.extract_size,
+                planned.crc,
             )
-            toc.append(
-                {
-                    "DirName": "",
-                    "FileName": entry.name,
-                    "FileSize": entry.size,
-                    "ExtractSize": entry.size,
-                    "FileOffset": entry.offset - _body_offset,
-                    "ID": entry.id_,
-                    "UserString": "",
-                }
+        content_size = self._content_end - self._content_offset
+        return Plan(
+            files=tuple(self._files),
+            content_offset=self._content_offset,
+            content_size=content_size,
+            tables=_build_tables(
+                self._config,
+                internal_toc,
+                self._content_offset,
+                content_size,
+                self._metrics,
+            ),
+        )
+
+
+class StreamWriter:
+    def __init__(
+        self,
+        fp: BinaryIO,
+        config: Config,
+        plan: Plan,
+        metrics: Metrics | None = None,
+        on_file: Callable[[FileReport], None] | None = None,
+    ):
+        self._fp = fp
+        self._config = config
+        self._plan = plan
+        self._metrics = metrics
+        self._on_file = on_file
+        self._position = 0
+        self._next = 0
+
+        fd = _regular_fileno(fp)
+        self.padding = Padder(
+            config.randomize_padding,
+            config.padding_seed,
+            fd is not None,
+            _body_offset,
+        )
+        self._file_end = 0
+        if fd is not None:
+            self._file_end = os.fstat(fd).st_size - fp.tell()
+        preallocate = not self.padding.sparse and hasattr(os, "posix_fallocate")
+        if fd is not None and preallocate:
+            try:
+                os.posix_fallocate(fd, fp.tell(), plan.file_size)
+            except OSError:
+                pass
+
+        self._write(plan.tables.header)
+        self._pad(_body_offset - self._position)
+        self._pad(plan.content_offset - self._position)
+
+    def write_file(self, planned: PlannedFile, fp: BinaryIO | None) -> FileReport:
+        if self._next >= len(self._plan.files):
+            raise ValueError(f"unexpected file: {planned.name!r}")
+        if self._plan.files[self._next] != planned:
+            raise ValueError(
+                f"expected {self._plan.files[self._next].name!r}, got {planned.name!r}"
             )
+        self._next += 1
 
-        internal_itoc.sort(key=lambda x: x.id_)
-        itoc = []
-        for entry in internal_itoc:
-            itoc.append(
-                {
-                    "ID": entry.id_,
-                    "TocIndex": entry.index,
-                }
+        start = perf_counter()
+        if planned.duplicate:
+            method = "duplicate"
+        else:
+            size = _remaining_size(fp)
+            if size != planned.size:
+                raise ValueError(
+                    f"size of {planned.name!r} changed: {planned.size} -> {size}"
+                )
+            self._pad(planned.offset - self._position)
+            start = perf_counter()
+            method, crc = _copy_sequential(fp, self._fp, size, self._config.file_crcs)
+            self._position += size
+            if crc is not None and crc != planned.crc:
+                raise ValueError(f"CRC of {planned.name!r} changed")
+
+        report = FileReport(
+            id_=planned.id_,
+            name=planned.name,
+            offset=planned.offset,
+            size=planned.size,
+            extract_size=planned.extract_size,
+            method=method,
+            crc=planned.crc,
+        )
+        _notify(self._metrics, self._on_file, report, perf_counter() - start)
+        return report
+
+    def close(self) -> None:
+        if self._next != len(self._plan.files):
+            raise ValueError(
+                f"{len(self._plan.files) - self._next} planned files were not written"
             )
+        tables = self._plan.tables
+        self._pad(tables.toc_offset - self._position)
+        self._write(tables.toc)
+        self._pad(tables.itoc_offset - self._position)
+        self._write(tables.itoc)
+        self._fp.flush()
+        if _regular_fileno(self._fp) is not None:
+            self._fp.truncate()
 
-        content_offset = self._content_offset
-        content_size = self._fp.tell() - content_offset
+    def _write(self, data: bytes) -> None:
+        write_bytes(self._fp, data)
+        self._position += len(data)
 
-        self._align()
-        toc_offset = self._fp.tell()
-        self._write_chunk_table(b"TOC ", Table(_toc_info_spec, tuple(toc)))
-        toc_size = self._fp.tell() - toc_offset
+    def _pad(self, size: int) -> None:
+        with phase(self._metrics, "pad", size):
+            self.padding.pad(
+                self._fp, self._position, size, max(self._file_end, self._position)
+            )
+            self._position += size
 
-        self._align()
-        itoc_offset = self._fp.tell()
-        self._write_chunk_table(b"ITOC", Table(_extend_id_spec, tuple(itoc)))
-        itoc_size = self._fp.tell() - itoc_offset
 
-        self._fp.seek(0)
-        self._write_chunk_table(
+def _build_tables(
+    config: Config,
+    internal_toc: _InternalToc,
+    content_offset: int,
+    content_size: int,
+    metrics: Metrics | None = None,
+) -> _Tables:
+    count = len(internal_toc)
+    names = internal_toc.names
+    ids = internal_toc.ids
+    with phase(metrics, "sort"):
+        toc_order = array("L", sorted(range(count), key=names.__getitem__))
+        _check_unique("name", names, toc_order)
+        itoc_order = array("L", sorted(range(count), key=ids.__getitem__))
+        _check_unique("id", ids, itoc_order)
+        toc_index = array("L", [0]) * count
+        for i, k in enumerate(toc_order):
+            toc_index[k] = i
+
+    columns = {
+        "DirName": [""] * count,
+        "FileName": [names[i] for i in toc_order],
+        "FileSize": array("Q", (internal_toc.sizes[i] for i in toc_order)),
+        "ExtractSize": array("Q", (internal_toc.extract_sizes[i] for i in toc_order)),
+        "FileOffset": array(
+            "Q", (internal_toc.offsets[i] - _body_offset for i in toc_order)
+        ),
+        "ID": array("q", (ids[i] for i in toc_order)),
+        "UserString": [""] * count,
+    }
+    if config.file_crcs:
+        columns["CRC"] = array("I", (internal_toc.crcs[i] for i in toc_order))
+        toc_spec = _toc_info_crc_spec
+    else:
+        toc_spec = _toc_info_spec
+
+    toc_offset = _align_offset(content_offset + content_size, config.alignment)
+    with phase(metrics, "toc"):
+        toc_chunk = _table_chunk(
+            config, b"TOC ", ColumnarTable(toc_spec, columns, count)
+        )
+    toc_size = len(toc_chunk)
+    del columns
+
+    itoc_offset = _align_offset(toc_offset + toc_size, config.alignment)
+    with phase(metrics, "itoc"):
+        itoc_chunk = _table_chunk(
+            config,
+            b"ITOC",
+            ColumnarTable(
+                _extend_id_spec,
+                {
+                    "ID": array("q", (ids[i] for i in itoc_order)),
+                    "TocIndex": array("q", (toc_index[i] for i in itoc_order)),
+                },
+                count,
+            ),
+        )
+    itoc_size = len(itoc_chunk)
+
+    toc_crc = 0
+    itoc_crc = 0
+    if config.file_crcs:
+        toc_crc = zlib.crc32(memoryview(toc_chunk)[16:])
+        itoc_crc = zlib.crc32(memoryview(itoc_chunk)[16:])
+
+    with phase(metrics, "header"):
+        header_chunk = _table_chunk(
+            config,
             b"CPK ",
             Table(
                 _header_spec,
@@ -224,24 +787,24 @@ class Writer:
                         "ContentSize": content_size,
                         "TocOffset": toc_offset,
                         "TocSize": toc_size,
-                        "TocCrc": 0,
+                        "TocCrc": toc_crc,
                         "HtocOffset": 0,
                         "HtocSize": 0,
                         "EtocOffset": 0,
                         "EtocSize": 0,
                         "ItocOffset": itoc_offset,
                         "ItocSize": itoc_size,
-                        "ItocCrc": 0,
+                        "ItocCrc": itoc_crc,
                         "GtocOffset": 0,
                         "GtocSize": 0,
                         "GtocCrc": 0,
                         "HgtocOffset": 0,
                         "HgtocSize": 0,
-                        "EnabledPackedSize": total_size,
-                        "EnabledDataSize": total_size,
+                        "EnabledPackedSize": sum(internal_toc.sizes),
+                        "EnabledDataSize": sum(internal_toc.extract_sizes),
                         "TotalDataSize": 0,
                         "Tocs": 0,
-                        "Files": len(self._internal_toc),
+                        "Files": count,
                         "Groups": 0,
                         "Attrs": 0,
                         "TotalFiles": 0,
@@ -249,7 +812,7 @@ class Writer:
                         "Updates": 0,
                         "Version": _format_version,
                         "Revision": _format_revision,
-                        "Align": self._config.alignment,
+                        "Align": config.alignment,
                         "Sorted": 1,
                         "EnableFileName": 1,
                         "EID": 1,
@@ -258,41 +821,539 @@ class Writer:
                         "Comment": "",
                         "Codec": 0,
                         "DpkItoc": 0,
-                        "EnableTocCrc": 0,
-                        "EnableFileCrc": 0,
-                        "CrcMode": 0,
+                        "EnableTocCrc": int(config.file_crcs),
+                        "EnableFileCrc": int(config.file_crcs),
+                        "CrcMode": int(config.file_crcs),
                         "CrcTable": b"",
                     },
                 ),
             ),
         )
-        if self._fp.tell() > _body_offset:
-            raise Exception("info is too large")
-        self._pad(_body_offset - self._fp.tell())
+    if len(header_chunk) > _body_offset:
+        raise Exception("info is too large")
+    return _Tables(
+        header=header_chunk,
+        toc_offset=toc_offset,
+        toc=toc_chunk,
+        itoc_offset=itoc_offset,
+        itoc=itoc_chunk,
+    )
 
-    def _write_chunk_table(self, name: bytes, table: Table) -> None:
-        data = encode_table(table)
-        self._write_chunk(name, data, self._config.encrypt_tables)
 
-    def _write_chunk(self, name: bytes, data: bytes, encrypted: bool) -> None:
-        if len(name) != 4:
-            raise ValueError(f"invalid chunk name: {name!r}")
-        write_bytes(self._fp, name)
-        if encrypted:
-            write_le_u(self._fp, 4, 0x00)
+def _check_unique(kind: str, values: Sequence[Any], order: Sequence[int]) -> None:
+    for a, b in zip(order, order[1:]):
+        if values[a] == values[b]:
+            raise ValueError(f"duplicate {kind}: {values[a]!r}")
+
+
+def _notify(
+    metrics: Metrics | None,
+    on_file: Callable[[FileReport], None] | None,
+    report: FileReport,
+    seconds: float,
+) -> None:
+    if metrics is not None:
+        size = 0 if report.method == "duplicate" else report.size
+        metrics.add("copy", seconds, size)
+        if metrics.record_entries:
+            metrics.add_entry(dict(vars(report)), seconds, size)
+    if on_file is not None:
+        on_file(report)
+
+
+def _table_chunk(
+    config: Config, name: bytes, table: Table | ColumnarTable
+) -> bytes:
+    data = encode_table(
+        table,
+        dedupe=config.dedupe_tables,
+        share_suffixes=config.share_string_suffixes,
+    )
+    return _chunk(name, data, config.encrypt_tables)
+
+
+def _chunk(name: bytes, data: bytes, encrypted: bool) -> bytes:
+    if len(name) != 4:
+        raise ValueError(f"invalid chunk name: {name!r}")
+    if encrypted:
+        data = crypt(data)
+    out = BinaryWriter(16 + len(data))
+    out.write(name)
+    out.pack("<IQ", 0x00 if encrypted else 0xFF, len(data))
+    out.write(data)
+    return out.getvalue()
+
+
+def _align_offset(offset: int, alignment: int) -> int:
+    return offset + -offset % alignment
+
+
+def _remaining_size(fp: BinaryIO) -> int:
+    position = fp.tell()
+    end = fp.seek(0, os.SEEK_END)
+    fp.seek(position)
+    return end - position
+
+
+def _copy_file(
+    src: BinaryIO, dst: BinaryIO, crc: bool = False
+) -> tuple[str, int, int | None]:
+    if crc:
+        size, value = _copy_stream_crc(src, dst)
+        return "readinto", size, value
+    src_fd = _regular_fileno(src)
+    dst_fd = _regular_fileno(dst)
+    if src_fd is not None and dst_fd is not None:
+        dst.flush()
+        src_offset = src.tell()
+        dst_offset = dst.tell()
+        size = max(os.fstat(src_fd).st_size - src_offset, 0)
+        method = copy_fd_range(src_fd, src_offset, dst_fd, dst_offset, size)
+        if method is not None:
+            src.seek(src_offset + size)
+            dst.seek(dst_offset + size)
+            return method, size, None
+    return "readinto", _copy_stream(src, dst), None
+
+
+def _copy_file_range(
+    src: BinaryIO,
+    src_offset: int,
+    dst: BinaryIO,
+    size: int,
+    crc: bool = False,
+    value: int | None = None,
+) -> tuple[str, int, int | None]:
+    if crc and value is None:
+        src.seek(src_offset)
+        copied, value = _copy_stream_crc(src, dst, size)
+        if copied != size:
+            raise EOFError
+        return "readinto", size, value
+    return copy_range(src, src_offset, dst, size), size, value if crc else None
+
+
+def copy_fd_range(
+    src_fd: int, src_offset: int, dst_fd: int, dst_offset: int, size: int
+) -> str | None:
+    if hasattr(os, "copy_file_range"):
+        copied = 0
+        try:
+            while copied < size:
+                n = os.copy_file_range(
+                    src_fd,
+                    dst_fd,
+                    min(size - copied, 1 << 30),
+                    src_offset + copied,
+                    dst_offset + copied,
+                )
+                if n == 0:
+                    raise EOFError
+                copied += n
+            return "copy_file_range"
+        except OSError:
+            if copied:
+                raise
+    if hasattr(os, "sendfile"):
+        copied = 0
+        try:
+            os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(
+                    dst_fd, src_fd, src_offset + copied, min(size - copied, 1 << 30)
+                )
+                if n == 0:
+                    raise EOFError
+                copied += n
+            return "sendfile"
+        except OSError:
+            if copied:
+                raise
+    return None
+
+
+def _copy_sequential(
+    src: BinaryIO, dst: BinaryIO, size: int, crc: bool = False
+) -> tuple[str, int | None]:
+    if crc:
+        copied, value = _copy_stream_crc(src, dst)
+        if copied != size:
+            raise EOFError
+        return "readinto", value
+    src_fd = _regular_fileno(src)
+    try:
+        dst_fd = dst.fileno()
+    except (AttributeError, OSError):
+        dst_fd = None
+    if src_fd is not None and dst_fd is not None and hasattr(os, "sendfile"):
+        dst.flush()
+        src_offset = src.tell()
+        copied = 0
+        try:
+            while copied < size:
+                n = os.sendfile(
+                    dst_fd, src_fd, src_offset + copied, min(size - copied, 1 << 30)
+                )
+                if n == 0:
+                    raise EOFError
+                copied += n
+            src.seek(src_offset + size)
+            return "sendfile", None
+        except OSError:
+            if copied:
+                raise
+    if _copy_stream(src, dst) != size:
+        raise EOFError
+    return "readinto", None
+
+
+def copy_range(src: BinaryIO, src_offset: int, dst: BinaryIO, size: int) -> str:
+    src_fd = _regular_fileno(src)
+    dst_fd = _regular_fileno(dst)
+    if src_fd is not None and dst_fd is not None:
+        dst.flush()
+        dst_offset = dst.tell()
+        method = copy_fd_range(src_fd, src_offset, dst_fd, dst_offset, size)
+        if method is not None:
+            dst.seek(dst_offset + size)
+            return method
+    src.seek(src_offset)
+    if _copy_stream(src, dst, size) != size:
+        raise EOFError
+    return "readinto"
+
+
+def _copy_stream(src: BinaryIO, dst: BinaryIO, limit: int | None = None) -> int:
+    buffer = _copy_buffer(src, limit)
+    size = 0
+    while limit is None or size < limit:
+        if limit is None:
+            n = src.readinto(buffer)
         else:
-            write_le_u(self._fp, 4, 0xFF)
-        write_le_u(self._fp, 8, len(data))
-        if encrypted:
-            data = _crypt(data)
-        write_bytes(self._fp, data)
+            n = src.readinto(buffer[: min(len(buffer), limit - size)])
+        if not n:
+            break
+        write_bytes(dst, buffer[:n])
+        size += n
+    return size
 
-    def _align(self) -> None:
-        self._pad(-self._fp.tell() % self._config.alignment)
 
-    def _pad(self, size: int) -> None:
-        if self._config.randomize_padding:
-            padding = os.urandom(size)
+def _copy_stream_crc(
+    src: BinaryIO, dst: BinaryIO, limit: int | None = None
+) -> tuple[int, int]:
+    buffer = _copy_buffer(src, limit)
+    size = 0
+    crc = 0
+    while limit is None or size < limit:
+        if limit is None:
+            n = src.readinto(buffer)
+        else:
+            n = src.readinto(buffer[: min(len(buffer), limit - size)])
+        if not n:
+            break
+        crc = zlib.crc32(buffer[:n], crc)
+        write_bytes(dst, buffer[:n])
+        size += n
+    return size, crc
+
+
+def _copy_buffer(src: BinaryIO, limit: int | None = None) -> memoryview:
+    size = _copy_buffer_size
+    try:
+        size = min(size, _remaining_size(src))
+    except (AttributeError, OSError):
+        pass
+    if limit is not None:
+        size = min(size, limit)
+    return memoryview(bytearray(max(size, 1)))
+
+
+def _regular_fileno(fp: BinaryIO) -> int | None:
+    try:
+        fd = fp.fileno()
+    except (AttributeError, OSError):
+        return None
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        return None
+    return fd
+
+
+class _KeyView(Sequence):
+    def __init__(self, length: int, get: Callable[[int], Any]):
+        self._length = length
+        self._get = get
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Any:
+        return self._get(index)
+
+
+class BlockCache:
+    def __init__(
+        self,
+        read: Callable[[int, int], bytes],
+        size: int,
+        block_size: int,
+        capacity: int,
+    ):
+        self.block_size = block_size
+        self.hits = 0
+        self.misses = 0
+        self._read = read
+        self._size = size
+        self._capacity = max(capacity, 1)
+        self._blocks = OrderedDict()
+        self._lock = Lock()
+
+    def readinto(self, offset: int, out: memoryview) -> int:
+        copied = 0
+        while copied < len(out):
+            index, start = divmod(offset + copied, self.block_size)
+            block = self._block(index)
+            n = min(len(out) - copied, len(block) - start)
+            if n <= 0:
+                break
+            out[copied : copied + n] = block[start : start + n]
+            copied += n
+        return copied
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+    def _block(self, index: int) -> bytes:
+        with self._lock:
+            block = self._blocks.get(index)
+            if block is not None:
+                self._blocks.move_to_end(index)
+                self.hits += 1
+                return block
+            self.misses += 1
+        offset = index * self.block_size
+        block = self._read(offset, max(min(self.block_size, self._size - offset), 0))
+        with self._lock:
+            self._blocks[index] = block
+            self._blocks.move_to_end(index)
+            while len(self._blocks) > self._capacity:
+                self._blocks.popitem(last=False)
+        return block
+
+
+class EntryFile(io.RawIOBase):
+    def __init__(self, cache: BlockCache, offset: int, size: int):
+        self._cache = cache
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        out = memoryview(buffer).cast("B")
+        n = max(min(len(out), self._size - self._position), 0)
+        if n:
+            n = self._cache.readinto(self._offset + self._position, out[:n])
+        self._position += n
+        return n
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        match whence:
+            case os.SEEK_SET:
+                position = offset
+            case os.SEEK_CUR:
+                position = self._position + offset
+            case os.SEEK_END:
+                position = self._size + offset
+            case _:
+                raise ValueError(f"invalid whence: {whence!r}")
+        if position < 0:
+            raise ValueError(f"negative seek position: {position}")
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class Reader:
+    def __init__(
+        self,
+        fp: BinaryIO,
+        block_size: int = _block_size,
+        cache_size: int = _cache_size,
+    ):
+        self._fd = fp.fileno()
+        self._mmap = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.size = len(self._view)
+        self._entries = None
+        self.cache = BlockCache(
+            self._read_block, self.size, block_size, cache_size // block_size
+        )
+
+        header_table, self.encrypted = self._read_chunk_table(0, b"CPK ")
+        self.header = header_table.row(0)
+        self.alignment = self.header["Align"]
+
+        self._toc, _ = self._read_chunk_table(self.header["TocOffset"], b"TOC ")
+        self._dir_names = self._toc.column_view("DirName")
+        self._file_names = self._toc.column_view("FileName")
+        count = len(self._toc)
+        self._names = _KeyView(count, lambda x: self._toc_name(self._order[x]))
+
+        self._itoc = None
+        if self.header["ItocOffset"]:
+            self._itoc, _ = self._read_chunk_table(self.header["ItocOffset"], b"ITOC")
+            self._ids = self._itoc.column_view("ID")
+            self._id_order = self._itoc.column_view("TocIndex")
         else:
-            padding = bytes(size)
-        write_bytes(self._fp, padding)
+            toc_ids = self._toc.column("ID")
+            self._id_order = sorted(range(count), key=toc_ids.__getitem__)
+            self._ids = [toc_ids[i] for i in self._id_order]
+
+    @cached_property
+    def _order(self) -> Sequence[int]:
+        count = len(self._toc)
+        if self.header["Sorted"] == 1 and all(
+            self._toc_name(i) <= self._toc_name(i + 1) for i in range(count - 1)
+        ):
+            return range(count)
+        return sorted(range(count), key=self._toc_name)
+
+    @property
+    def entries(self) -> tuple[Entry, ...]:
+        if self._entries is None:
+            self._entries = tuple(self._entry(i) for i in self._order)
+        return self._entries
+
+    @property
+    def config(self) -> Config:
+        offsets = [entry.offset for entry in self.entries if entry.size]
+        return Config(
+            alignment=self.alignment,
+            encrypt_tables=self.encrypted,
+            randomize_padding=self._has_random_padding(),
+            deduplicate_entries=len(set(offsets)) != len(offsets),
+            file_crcs=bool(self.header["EnableFileCrc"]),
+        )
+
+    def find(self, name: str) -> Entry:
+        return self._entry(self._order[self._find_index(name)])
+
+    def find_by_id(self, id_: int) -> Entry:
+        i = bisect_left(self._ids, id_)
+        if i == len(self._ids) or self._ids[i] != id_:
+            raise KeyError(id_)
+        return self._entry(self._id_order[i])
+
+    def list_entries(self, prefix: str = "") -> tuple[Entry, ...]:
+        start = bisect_left(self._names, prefix)
+        end = start
+        while end < len(self._names) and self._names[end].startswith(prefix):
+            end += 1
+        return tuple(self._entry(self._order[i]) for i in range(start, end))
+
+    def _has_random_padding(self) -> bool:
+        (size,) = BinaryReader(self._view, 8).unpack("<Q")
+        start = 16 + size
+        end = self.header["ContentOffset"]
+        if end <= start:
+            return False
+        with self.read_range(start, end - start) as padding:
+            return any(padding)
+
+    def read_entry(self, entry: Entry) -> memoryview:
+        return self._view[entry.offset : entry.offset + entry.size]
+
+    def read_range(self, offset: int, size: int) -> memoryview:
+        if offset < 0 or offset + size > self.size:
+            raise EOFError
+        return self._view[offset : offset + size]
+
+    def open_entry(self, name: str) -> BinaryIO:
+        entry = self.find(name)
+        if entry.size != entry.extract_size:
+            return io.BytesIO(self.extract_entry(entry))
+        return EntryFile(self.cache, entry.offset, entry.size)
+
+    def extract_entry(self, entry: Entry) -> bytes | memoryview:
+        data = self.read_entry(entry)
+        if entry.size == entry.extract_size:
+            return data
+        return decompress(data)
+
+    def extract_entry_into(self, entry: Entry, out: bytearray | memoryview) -> int:
+        data = self.read_entry(entry)
+        if entry.size == entry.extract_size:
+            out[: entry.size] = data
+            return entry.size
+        return decompress_into(data, out)
+
+    def extract_entry_to(self, entry: Entry, fp: BinaryIO) -> int:
+        data = self.read_entry(entry)
+        if entry.size == entry.extract_size:
+            fp.write(data)
+            return entry.size
+        return decompress_to_file(data, fp)
+
+    def close(self) -> None:
+        self.cache.clear()
+        self._toc = None
+        self._itoc = None
+        self._dir_names = None
+        self._file_names = None
+        self._ids = None
+        self._id_order = None
+        self._view.release()
+        self._mmap.close()
+
+    def _read_block(self, offset: int, size: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, size, offset)
+        return bytes(self._view[offset : offset + size])
+
+    def _entry(self, toc_index: int) -> Entry:
+        row = self._toc.row(toc_index)
+        return Entry(
+            id_=row["ID"],
+            name=_join_name(row["DirName"], row["FileName"]),
+            offset=_body_offset + row["FileOffset"],
+            size=row["FileSize"],
+            extract_size=row["ExtractSize"],
+            crc=row.get("CRC"),
+        )
+
+    def _toc_name(self, toc_index: int) -> str:
+        return _join_name(self._dir_names[toc_index], self._file_names[toc_index])
+
+    def _find_index(self, name: str) -> int:
+        i = bisect_left(self._names, name)
+        if i == len(self._names) or self._names[i] != name:
+            raise KeyError(name)
+        return i
+
+    def _read_chunk_table(self, offset: int, name: bytes) -> tuple[LazyTable, bool]:
+        data, encrypted = self._read_chunk(offset, name)
+        return decode_lazy_table(data), encrypted
+
+    def _read_chunk(self, offset: int, name: bytes) -> tuple[bytes | memoryview, bool]:
+        reader = BinaryReader(self._view, offset)
+        reader.expect(name)
+        flags, size = reader.unpack("<IQ")
+        data = reader.read(size)
+        encrypted = flags == 0x00
+        if encrypted:
+            data = crypt(data)
+        return data, encrypted
+
+
+def _join_name(dir_name: str, file_name: str) -> str:
+    if not dir_name:
+        return file_name
+    return f"{dir_name}/{file_name}"
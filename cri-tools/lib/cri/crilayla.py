@@ -0,0 +1,292 @@
+import mmap
+import os
+from typing import BinaryIO
+import zlib
+
+_magic = b"CRILAYLA"
+_raw_header_size = 0x100
+_min_match = 3
+_max_distance = 0x1FFF + _min_match
+_length_bits = (2, 3, 5, 8)
+_chain_depth = 16
+_compare_size = 64
+_nice_length = 256
+_sample_size = 64 * 1024
+_sample_ratio = 0.9
+
+
+class _BitWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self._acc = 0
+        self._count = 0
+
+    def write(self, value: int, bits: int) -> None:
+        self._acc = (self._acc << bits) | value
+        self._count += bits
+        if self._count >= 32:
+            rest = self._count & 7
+            self.data += (self._acc >> rest).to_bytes(self._count >> 3, "big")
+            self._acc &= (1 << rest) - 1
+            self._count = rest
+
+    def finish(self) -> bytes:
+        if self._count:
+            rest = -self._count % 8
+            self.data += (self._acc << rest).to_bytes((self._count + rest) >> 3, "big")
+            self._acc = 0
+            self._count = 0
+        return bytes(self.data)
+
+
+def _write_length(bits: _BitWriter, length: int) -> None:
+    rest = length - _min_match
+    for width in _length_bits:
+        limit = (1 << width) - 1
+        if rest < limit:
+            bits.write(rest, width)
+            return
+        bits.write(limit, width)
+        rest -= limit
+    while True:
+        value = min(rest, 0xFF)
+        bits.write(value, 8)
+        rest -= value
+        if value != 0xFF:
+            return
+
+
+def _match_length(data: bytes, source: int, target: int) -> int:
+    limit = len(data) - target
+    length = 0
+    while length < limit:
+        size = min(_compare_size, limit - length)
+        a = data[source + length : source + length + size]
+        b = data[target + length : target + length + size]
+        if a != b:
+            diff = int.from_bytes(a, "big") ^ int.from_bytes(b, "big")
+            return length + (size * 8 - diff.bit_length()) // 8
+        length += size
+    return length
+
+
+def looks_compressible(data: bytes) -> bool:
+    if len(data) <= _raw_header_size:
+        return False
+    if len(data) <= _sample_size * 2:
+        sample = data
+    else:
+        middle = len(data) // 2
+        sample = data[:_sample_size] + data[middle : middle + _sample_size]
+    return len(zlib.compress(sample, 1)) < len(sample) * _sample_ratio
+
+
+def compress(data: bytes) -> bytes | None:
+    if len(data) <= _raw_header_size:
+        return None
+    body = data[:_raw_header_size - 1 : -1]
+    size = len(body)
+    bits = _BitWriter()
+    chains = {}
+
+    i = 0
+    while i < size:
+        best_length = 0
+        best_distance = 0
+        key = body[i : i + _min_match]
+        chain = chains.get(key)
+        if chain is not None and len(key) == _min_match:
+            for source in reversed(chain):
+                distance = i - source
+                if distance < _min_match:
+                    continue
+                if distance > _max_distance:
+                    break
+                if (
+                    best_length
+                    and i + best_length < size
+                    and body[source + best_length] != body[i + best_length]
+                ):
+                    continue
+                length = _match_length(body, source, i)
+                if length > best_length:
+                    best_length = length
+                    best_distance = distance
+                    if length >= _nice_length:
+                        break
+
+        if best_length >= _min_match:
+            bits.write(1, 1)
+            bits.write(best_distance - _min_match, 13)
+            _write_length(bits, best_length)
+            step = best_length
+        else:
+            bits.write(body[i], 9)
+            step = 1
+
+        for position in range(i, min(i + step, size - _min_match + 1)):
+            key = body[position : position + _min_match]
+            chain = chains.get(key)
+            if chain is None:
+                chains[key] = [position]
+            else:
+                chain.append(position)
+                if len(chain) > _chain_depth * 2:
+                    del chain[:-_chain_depth]
+        i += step
+
+    compressed = bits.finish()[::-1]
+    result = b"".join(
+        (
+            _magic,
+            size.to_bytes(4, "little"),
+            len(compressed).to_bytes(4, "little"),
+            compressed,
+            data[:_raw_header_size],
+        )
+    )
+    if len(result) >= len(data):
+        return None
+    return result
+
+
+def _make_length_table() -> list[tuple[int, int, bool]]:
+    table = []
+    for peek in range(1 << 16):
+        value = peek >> 13
+        if value < 7:
+            table.append((value, 3, True))
+            continue
+        value = (peek >> 8) & 0x1F
+        if value < 0x1F:
+            table.append((7 + value, 8, True))
+            continue
+        value = peek & 0xFF
+        table.append((7 + 0x1F + value, 16, value < 0xFF))
+    return table
+
+
+_length_table = None
+
+
+def extract_size(src: bytes | memoryview) -> int:
+    header = bytes(src[:16])
+    if header[:8] != _magic:
+        raise ValueError(f"expected {_magic!r}, got {header[:8]!r}")
+    return int.from_bytes(header[8:12], "little") + _raw_header_size
+
+
+def decompress_into(src: bytes | memoryview, out: bytearray | memoryview) -> int:
+    global _length_table
+    if _length_table is None:
+        _length_table = _make_length_table()
+    length_table = _length_table
+
+    src = memoryview(src).cast("B")
+    size = extract_size(src) - _raw_header_size
+    compressed_size = int.from_bytes(src[12:16], "little")
+    header_offset = 16 + compressed_size
+    if len(src) < header_offset + _raw_header_size:
+        raise EOFError
+    if len(out) < size + _raw_header_size:
+        raise ValueError("output buffer is too small")
+    out[:_raw_header_size] = src[header_offset : header_offset + _raw_header_size]
+
+    stream = src[16:header_offset]
+    position = len(stream)
+    buffer = 0
+    count = 0
+    end = _raw_header_size
+    p = end + size
+    while p > end:
+        if count < 32 and position:
+            take = min(position, 6)
+            position -= take
+            chunk = int.from_bytes(stream[position : position + take], "little")
+            buffer = ((buffer & ((1 << count) - 1)) << (take * 8)) | chunk
+            count += take * 8
+
+        if not (buffer >> (count - 1)) & 1:
+            count -= 9
+            if count < 0:
+                raise EOFError
+            p -= 1
+            out[p] = (buffer >> count) & 0xFF
+            continue
+
+        count -= 16
+        peek = buffer >> count if count >= 0 else buffer << -count
+        distance = ((peek >> 2) & 0x1FFF) + _min_match
+        length = _min_match + (peek & 3)
+        if peek & 3 == 3:
+            count -= 16
+            peek = buffer >> count if count >= 0 else buffer << -count
+            add, used, done = length_table[peek & 0xFFFF]
+            length += add
+            count += 16 - used
+            while not done:
+                if count < 8 and position:
+                    take = min(position, 6)
+                    position -= take
+                    chunk = int.from_bytes(stream[position : position + take], "little")
+                    buffer = ((buffer & ((1 << count) - 1)) << (take * 8)) | chunk
+                    count += take * 8
+                count -= 8
+                if count < 0:
+                    raise EOFError
+                value = (buffer >> count) & 0xFF
+                length += value
+                done = value != 0xFF
+        if count < 0:
+            raise EOFError
+
+        start = max(p - length, end)
+        length = p - start
+        if distance >= length:
+            out[start:p] = out[start + distance : p + distance]
+        else:
+            pattern = bytes(out[p : p + distance])
+            shift = -length % distance
+            repeated = pattern * ((length + shift) // distance + 1)
+            out[start:p] = repeated[shift : shift + length]
+        p = start
+    return size + _raw_header_size
+
+
+def decompress(src: bytes | memoryview) -> bytes:
+    out = bytearray(extract_size(src))
+    decompress_into(src, out)
+    return bytes(out)
+
+
+def decompress_to_file(src: bytes | memoryview, fp: BinaryIO) -> int:
+    size = extract_size(src)
+    if size and fp.seekable() and _decompress_mapped(src, fp, size):
+        return size
+    out = bytearray(size)
+    decompress_into(src, out)
+    fp.write(out)
+    return size
+
+
+def _decompress_mapped(src: bytes | memoryview, fp: BinaryIO, size: int) -> bool:
+    try:
+        fd = fp.fileno()
+    except (AttributeError, OSError):
+        return False
+    start = fp.tell()
+    fp.flush()
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+    try:
+        os.ftruncate(fd, start + size)
+        mapping = mmap.mmap(fd, start + size - offset, offset=offset)
+    except OSError:
+        return False
+    with mapping:
+        view = memoryview(mapping)
+        try:
+            decompress_into(src, view[start - offset :])
+        finally:
+            view.release()
+    fp.seek(start + size)
+    return True
@@ -0,0 +1,33 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_initial_key = 0x5F
+_key_multiplier = 0x15
+
+
+def _make_period() -> bytes:
+    period = bytearray()
+    key = _initial_key
+    while True:
+        period.append(key)
+        key = (key * _key_multiplier) & 0xFF
+        if key == _initial_key:
+            return bytes(period)
+
+
+_period = _make_period()
+
+
+def keystream(length: int) -> bytes:
+    return (_period * -(-length // len(_period)))[:length]
+
+
+def crypt(data: bytes) -> bytes:
+    length = len(data)
+    if numpy is not None:
+        stream = numpy.resize(numpy.frombuffer(_period, numpy.uint8), length)
+        return (numpy.frombuffer(data, numpy.uint8) ^ stream).tobytes()
+    value = int.from_bytes(data, "little") ^ int.from_bytes(keystream(length), "little")
+    return value.to_bytes(length, "little")
@@ -0,0 +1,55 @@
+import os
+import random
+from typing import BinaryIO
+
+from lib.codecutils import write_bytes
+
+_buffer_size = 1 << 16
+
+
+class Padder:
+    def __init__(
+        self,
+        randomize: bool,
+        seed: int | None = None,
+        sparse: bool = True,
+        reserved: int = 0,
+    ):
+        self._random = random.Random(seed) if randomize else None
+        self._reserved = b""
+        if self._random is not None:
+            self._reserved = self._random.randbytes(reserved)
+        self._sparse = sparse
+        self._zeros = memoryview(bytes(_buffer_size))
+        self.written = 0
+        self.skipped = 0
+
+    @property
+    def sparse(self) -> bool:
+        return self._sparse and self._random is None
+
+    def pad(self, fp: BinaryIO, position: int, size: int, clean_offset: int) -> None:
+        if size < 0:
+            raise ValueError(f"negative padding: {size}")
+        if size == 0:
+            return
+        if self._random is not None:
+            reserved = self._reserved[position : position + size]
+            write_bytes(fp, reserved)
+            if len(reserved) < size:
+                write_bytes(fp, self._random.randbytes(size - len(reserved)))
+            self.written += size
+            return
+
+        dirty = size
+        if self._sparse:
+            dirty = min(max(clean_offset - position, 0), size)
+        remaining = dirty
+        while remaining:
+            n = min(remaining, _buffer_size)
+            write_bytes(fp, self._zeros[:n])
+            remaining -= n
+        if dirty < size:
+            fp.seek(size - dirty, os.SEEK_CUR)
+        self.written += dirty
+        self.skipped += size - dirty
@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+import hashlib
+import json
+from typing import Any, BinaryIO
+
+from lib.codecutils import (
+    BinaryReader,
+    BinaryWriter,
+    read_any_bytes,
+    write_bytes,
+)
+from lib.cri.cpk import Reader, copy_range
+
+_magic = b"CPKPATCH"
+_version = 2
+_prefix_size = len(_magic) + 12
+_hash_chunk_size = 8 * 1024 * 1024
+_zero_block_size = 2048
+
+
+@dataclass(frozen=True)
+class DiffReport:
+    added: int
+    removed: int
+    changed: int
+    unchanged: int
+    copied_size: int
+    data_size: int
+    zero_size: int
+
+
+def diff(old_fp: BinaryIO, new_fp: BinaryIO, patch_fp: BinaryIO) -> DiffReport:
+    old = Reader(old_fp)
+    new = Reader(new_fp)
+    try:
+        return _diff(old, new, patch_fp)
+    finally:
+        old.close()
+        new.close()
+
+
+def _diff(old: Reader, new: Reader, patch_fp: BinaryIO) -> DiffReport:
+    sizes = {entry.size for entry in new.entries if entry.size}
+    old_digests = {}
+    new_digests = {}
+    sources = {}
+    for entry in old.entries:
+        if entry.size in sizes:
+            digest = _cached_digest(old_digests, old, entry.offset, entry.size)
+            sources.setdefault((entry.size, digest), entry.offset)
+
+    segments = []
+    position = 0
+    for offset, size in sorted({(e.offset, e.size) for e in new.entries if e.size}):
+        if offset < position:
+            continue
+        _add_gap(segments, new, position, offset)
+        digest = _cached_digest(new_digests, new, offset, size)
+        source = sources.get((size, digest))
+        if source is None:
+            _add_segment(segments, "data", offset, size)
+        else:
+            segments.append(("copy", source, size, digest))
+        position = offset + size
+    _add_gap(segments, new, position, new.size)
+
+    old_by_name = {entry.name: entry for entry in old.entries}
+    new_names = set()
+    added = 0
+    changed = 0
+    unchanged = 0
+    for entry in new.entries:
+        new_names.add(entry.name)
+        previous = old_by_name.get(entry.name)
+        if previous is None:
+            added += 1
+        elif previous.size == entry.size and (
+            entry.size == 0
+            or _cached_digest(old_digests, old, previous.offset, previous.size)
+            == _cached_digest(new_digests, new, entry.offset, entry.size)
+        ):
+            unchanged += 1
+        else:
+            changed += 1
+    removed = sum(1 for name in old_by_name if name not in new_names)
+
+    header = {
+        "source": {"size": old.size, "toc": _toc_digest(old)},
+        "target": {"size": new.size, "digest": _hash_range(new, 0, new.size)},
+        "segments": [
+            [kind, size] if kind != "copy" else [kind, size, offset, digest]
+            for kind, offset, size, digest in segments
+        ],
+    }
+    data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    out = BinaryWriter(_prefix_size + len(data))
+    out.write(_magic)
+    out.pack("<IQ", _version, len(data))
+    out.write(data)
+    write_bytes(patch_fp, out.getvalue())
+
+    totals = {"copy": 0, "data": 0, "zero": 0}
+    for kind, offset, size, _ in segments:
+        totals[kind] += size
+        if kind == "data":
+            for start in range(offset, offset + size, _hash_chunk_size):
+                end = min(start + _hash_chunk_size, offset + size)
+                with new.read_range(start, end - start) as chunk:
+                    write_bytes(patch_fp, chunk)
+
+    return DiffReport(
+        added=added,
+        removed=removed,
+        changed=changed,
+        unchanged=unchanged,
+        copied_size=totals["copy"],
+        data_size=totals["data"],
+        zero_size=totals["zero"],
+    )
+
+
+def apply(old_fp: BinaryIO, patch_fp: BinaryIO, out_fp: BinaryIO) -> dict[str, Any]:
+    prefix = BinaryReader(read_any_bytes(patch_fp, _prefix_size))
+    prefix.expect(_magic)
+    version, length = prefix.unpack("<IQ")
+    if version != _version:
+        raise ValueError(f"unsupported patch version: {version}")
+    header = json.loads(read_any_bytes(patch_fp, length).decode("utf-8"))
+
+    old = Reader(old_fp)
+    try:
+        _apply(old, header, patch_fp, out_fp)
+    finally:
+        old.close()
+    return header["target"]
+
+
+def _apply(old: Reader, header: Any, patch_fp: BinaryIO, out_fp: BinaryIO) -> None:
+    if {"size": old.size, "toc": _toc_digest(old)} != header["source"]:
+        raise ValueError("patch does not match the old archive")
+
+    position = patch_fp.tell()
+    zeros = bytes(_hash_chunk_size)
+    for segment in header["segments"]:
+        kind, size = segment[0], segment[1]
+        match kind:
+            case "copy":
+                _copy_checked(old, segment[2], size, segment[3], out_fp)
+            case "data":
+                copy_range(patch_fp, position, out_fp, size)
+                position += size
+            case "zero":
+                while size:
+                    n = min(size, len(zeros))
+                    write_bytes(out_fp, zeros[:n])
+                    size -= n
+            case _:
+                raise ValueError(f"unknown segment: {kind!r}")
+    out_fp.truncate()
+
+
+def _copy_checked(
+    reader: Reader, offset: int, size: int, expected: str, out_fp: BinaryIO
+) -> None:
+    digest = hashlib.sha256()
+    for start in range(offset, offset + size, _hash_chunk_size):
+        end = min(start + _hash_chunk_size, offset + size)
+        with reader.read_range(start, end - start) as chunk:
+            digest.update(chunk)
+            write_bytes(out_fp, chunk)
+    if digest.hexdigest() != expected:
+        raise ValueError(f"old archive differs at bytes {offset}-{offset + size}")
+
+
+def _add_gap(
+    segments: list[tuple[str, int, int, str | None]],
+    reader: Reader,
+    start: int,
+    end: int,
+) -> None:
+    zero = bytes(_zero_block_size)
+    for block in range(start, end, _zero_block_size):
+        size = min(_zero_block_size, end - block)
+        with reader.read_range(block, size) as chunk:
+            kind = "zero" if chunk == zero[:size] else "data"
+        _add_segment(segments, kind, block, size)
+
+
+def _add_segment(
+    segments: list[tuple[str, int, int, str | None]],
+    kind: str,
+    offset: int,
+    size: int,
+) -> None:
+    if segments:
+        last_kind, last_offset, last_size, _ = segments[-1]
+        if last_kind == kind and (kind == "zero" or last_offset + last_size == offset):
+            segments[-1] = (kind, last_offset, last_size + size, None)
+            return
+    segments.append((kind, offset, size, None))
+
+
+def _hash_range(reader: Reader, offset: int, size: int) -> str:
+    digest = hashlib.sha256()
+    for start in range(offset, offset + size, _hash_chunk_size):
+        end = min(start + _hash_chunk_size, offset + size)
+        with reader.read_range(start, end - start) as chunk:
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cached_digest(
+    cache: dict[tuple[int, int], str], reader: Reader, offset: int, size: int
+) -> str:
+    digest = cache.get((offset, size))
+    if digest is None:
+        digest = cache[(offset, size)] = _hash_range(reader, offset, size)
+    return digest
+
+
+def _toc_digest(reader: Reader) -> str:
+    return _hash_range(reader, reader.header["TocOffset"], reader.header["TocSize"])
+
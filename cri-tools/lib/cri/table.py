@@ -1,20 +1,23 @@
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
 from enum import IntEnum
-from io import BytesIO
-from typing import Any, BinaryIO
+from functools import lru_cache
+from operator import itemgetter
+import struct
+import sys
+from typing import Any, BinaryIO, Callable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from lib.codecutils import (
+    BinaryReader,
+    BinaryWriter,
     write_bytes,
-    write_be_u,
-    write_be_s,
-    write_be_f4,
-    write_be_f8,
     read_any_bytes,
-    read_bytes,
-    read_any_be_u,
-    read_any_be_s,
-    read_any_be_f4,
-    read_any_be_f8,
 )
 
 
@@ -63,6 +66,60 @@ class Table:
     rows: tuple[dict[str, Any], ...]
 
 
+class _ColumnarRows(Sequence):
+    def __init__(self, table: "ColumnarTable"):
+        self._columns = [
+            (column.name, table.columns[column.name]) for column in table.spec.columns
+        ]
+        self._length = table.row_count
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return {name: _scalar(values[index]) for name, values in self._columns}
+
+
+@dataclass(frozen=True)
+class ColumnarTable:
+    spec: Spec
+    columns: dict[str, Sequence[Any]]
+    row_count: int
+
+    @property
+    def rows(self) -> Sequence[dict[str, Any]]:
+        return _ColumnarRows(self)
+
+    @staticmethod
+    def from_rows(spec: Spec, rows: Sequence[dict[str, Any]]) -> "ColumnarTable":
+        columns = {}
+        for column in spec.columns:
+            values = (row[column.name] for row in rows)
+            match column.kind:
+                case Kind.Chars:
+                    columns[column.name] = [sys.intern(value) for value in values]
+                case Kind.Bytes:
+                    columns[column.name] = list(values)
+                case kind:
+                    columns[column.name] = array(_array_codes[kind], values)
+        return ColumnarTable(spec, columns, len(rows))
+
+    def to_table(self) -> Table:
+        return Table(self.spec, tuple(self.rows))
+
+
+def _scalar(value: Any) -> Any:
+    if numpy is not None and isinstance(value, numpy.generic):
+        return value.item()
+    return value
+
+
 _default_values = {
     Kind.U1: 0,
     Kind.S1: 0,
@@ -79,94 +136,188 @@ _default_values = {
 }
 
 
+_struct_codes = {
+    Kind.U1: "B",
+    Kind.S1: "b",
+    Kind.U2: "H",
+    Kind.S2: "h",
+    Kind.U4: "I",
+    Kind.S4: "i",
+    Kind.U8: "Q",
+    Kind.S8: "q",
+    Kind.F4: "f",
+    Kind.F8: "d",
+    Kind.Chars: "I",
+    Kind.Bytes: "Q",
+}
+
+
+_array_codes = {
+    Kind.U1: "B",
+    Kind.S1: "b",
+    Kind.U2: "H",
+    Kind.S2: "h",
+    Kind.U4: "I" if array("I").itemsize == 4 else "L",
+    Kind.S4: "i" if array("i").itemsize == 4 else "l",
+    Kind.U8: "Q",
+    Kind.S8: "q",
+    Kind.F4: "f",
+    Kind.F8: "d",
+    Kind.Chars: "I" if array("I").itemsize == 4 else "L",
+    Kind.Bytes: "Q",
+}
+
+
+@dataclass(frozen=True)
+class _RowCodec:
+    row: struct.Struct
+    columns: tuple[Column, ...]
+    get: Callable[[dict[str, Any]], tuple[Any, ...]]
+
+
+@lru_cache(maxsize=64)
+def _compile_row(columns: tuple[Column, ...], constants: tuple[bool, ...]) -> _RowCodec:
+    stored = tuple(
+        column for column, constant in zip(columns, constants) if not constant
+    )
+    names = [column.name for column in stored]
+    if len(names) == 1:
+        name = names[0]
+        get = lambda row: (row[name],)
+    elif names:
+        get = itemgetter(*names)
+    else:
+        get = lambda row: ()
+    return _RowCodec(
+        row=struct.Struct(">" + "".join(_struct_codes[c.kind] for c in stored)),
+        columns=stored,
+        get=get,
+    )
+
+
 class _CharsBuilder:
-    def __init__(self):
+    def __init__(self, dedupe: bool = False, share_suffixes: bool = False):
         self.data = bytearray(b"<NULL>\x00")
+        self._dedupe = dedupe or share_suffixes
+        self._share_suffixes = share_suffixes
+        self._offsets = {}
 
     def add(self, value: str) -> int:
         if not value:
             return 0
+        if not self._dedupe:
+            offset = len(self.data)
+            self.data += value.encode("utf-8") + b"\x00"
+            return offset
+
+        offset = self._offsets.get(value)
+        if offset is not None:
+            return offset
+        encoded = value.encode("utf-8")
+        if self._share_suffixes:
+            offset = self._offsets.get(encoded)
+            if offset is not None:
+                self._offsets[value] = offset
+                return offset
         offset = len(self.data)
-        self.data += value.encode("utf-8") + b"\x00"
+        self.data += encoded + b"\x00"
+        self._offsets[value] = offset
+        if self._share_suffixes:
+            for i in range(len(encoded)):
+                self._offsets.setdefault(encoded[i:], offset + i)
         return offset
 
-    def build(self, fp: BinaryIO) -> None:
-        fp.write(self.data)
+    def build(self, out: BinaryWriter) -> None:
+        out.write(self.data)
 
 
 class _BytesBuilder:
-    def __init__(self):
+    def __init__(self, dedupe: bool = False):
         self.data = bytearray()
+        self._dedupe = dedupe
+        self._offsets = {}
 
     def add(self, value: bytes) -> int:
         if not value:
             return 0
+        if self._dedupe:
+            offset = self._offsets.get(value)
+            if offset is not None:
+                return offset
         offset = len(self.data)
         self.data += value
+        if self._dedupe:
+            self._offsets[bytes(value)] = offset
         return offset
 
-    def build(self, fp: BinaryIO) -> None:
-        fp.write(self.data)
+    def build(self, out: BinaryWriter) -> None:
+        out.write(self.data)
 
 
 class _Writer:
-    def __init__(self, fp: BinaryIO, table: Table):
-        self._fp = fp
+    def __init__(
+        self,
+        out: BinaryWriter,
+        table: Table | ColumnarTable,
+        dedupe: bool,
+        share_suffixes: bool,
+    ):
+        self._out = out
+        self._base = out.position
         self._table = table
-        self._chars = _CharsBuilder()
-        self._bytes = _BytesBuilder()
+        self._chars = _CharsBuilder(dedupe, share_suffixes)
+        self._bytes = _BytesBuilder(dedupe)
 
     def write(self) -> None:
+        out = self._out
         name_offset = self._chars.add(self._table.spec.name)
-
-        write_be_u(self._fp, 2, self._table.spec.string_encoding)
-        rows_offset_position = self._fp.tell()
-        write_be_u(self._fp, 2, 0)
-        strings_offset_position = self._fp.tell()
-        write_be_u(self._fp, 4, 0)
-        blobs_offset_position = self._fp.tell()
-        write_be_u(self._fp, 4, 0)
-        write_be_u(self._fp, 4, name_offset)
-        write_be_u(self._fp, 2, len(self._table.spec.columns))
-        row_size_position = self._fp.tell()
-        write_be_u(self._fp, 2, 0)
-        write_be_u(self._fp, 4, len(self._table.rows))
+        header_slot = out.reserve(_header)
 
         self._write_columns()
 
-        rows_offset = self._fp.tell()
+        rows_offset = self._tell()
         self._write_rows()
 
-        strings_offset = self._fp.tell()
-        self._chars.build(self._fp)
-
-        write_bytes(self._fp, bytes(-self._fp.tell() % 8))
-        blobs_offset = self._fp.tell()
-        self._bytes.build(self._fp)
-        write_bytes(self._fp, bytes(-self._fp.tell() % 8))
-
-        tmp = self._fp.tell()
-        self._fp.seek(rows_offset_position)
-        write_be_u(self._fp, 2, rows_offset)
-        self._fp.seek(strings_offset_position)
-        write_be_u(self._fp, 4, strings_offset)
-        self._fp.seek(blobs_offset_position)
-        write_be_u(self._fp, 4, blobs_offset)
-        self._fp.seek(row_size_position)
-        write_be_u(self._fp, 2, self._row_size)
-        self._fp.seek(tmp)
+        strings_offset = self._tell()
+        self._chars.build(out)
+
+        out.zeros(-self._tell() % 8)
+        blobs_offset = self._tell()
+        self._bytes.build(out)
+        out.zeros(-self._tell() % 8)
+
+        out.patch(
+            header_slot,
+            _header,
+            self._table.spec.string_encoding,
+            rows_offset,
+            strings_offset,
+            blobs_offset,
+            name_offset,
+            len(self._table.spec.columns),
+            self._row_size,
+            len(self._table.rows),
+        )
+
+    def _tell(self) -> int:
+        return self._out.position - self._base
 
     def _write_columns(self) -> None:
         constants = []
+        codes = [">"]
+        values = []
         for column in self._table.spec.columns:
-            constant = None
-            for row in self._table.rows:
-                value = row[column.name]
-                if constant is None:
-                    constant = value
-                elif [constant] != [value]:
-                    constant = None
-                    break
+            if isinstance(self._table, ColumnarTable):
+                constant = _find_constant(self._table.columns[column.name])
+            else:
+                constant = None
+                for row in self._table.rows:
+                    value = row[column.name]
+                    if constant is None:
+                        constant = value
+                    elif [constant] != [value]:
+                        constant = None
+                        break
             constants.append(constant is not None)
 
             kind = column.kind
@@ -177,216 +328,372 @@ class _Writer:
             else:
                 storage = _Storage.DEFAULT
 
-            info = (storage << 4) | kind
-            name_offset = self._chars.add(column.name)
-
-            write_be_u(self._fp, 1, info)
-            write_be_u(self._fp, 4, name_offset)
+            codes.append("BI")
+            values.append((storage << 4) | kind)
+            values.append(self._chars.add(column.name))
             if storage == _Storage.CONSTANT:
-                self._write_value(kind, constant)
+                codes.append(_struct_codes[kind] if kind != Kind.Bytes else "II")
+                match kind:
+                    case Kind.Chars:
+                        values.append(self._chars.add(constant))
+                    case Kind.Bytes:
+                        values.append(self._bytes.add(constant))
+                        values.append(len(constant))
+                    case _:
+                        values.append(constant)
+        self._out.pack("".join(codes), *values)
         self._constants = constants
 
     def _write_rows(self) -> None:
-        row_size = 0
-        for i in range(len(self._table.rows)):
-            row_start = self._fp.tell()
-            self._write_row(i)
-            row_size = self._fp.tell() - row_start
-        self._row_size = row_size
-
-    def _write_row(self, index: int) -> None:
-        row = self._table.rows[index]
-        for column, constant in zip(self._table.spec.columns, self._constants):
-            value = row[column.name]
-            if not constant:
-                self._write_value(column.kind, value)
-
-    def _write_value(self, kind: Kind, value: Any) -> None:
-        match kind:
-            case Kind.U1:
-                write_be_u(self._fp, 1, value)
-            case Kind.S1:
-                write_be_s(self._fp, 1, value)
-            case Kind.U2:
-                write_be_u(self._fp, 2, value)
-            case Kind.S2:
-                write_be_s(self._fp, 2, value)
-            case Kind.U4:
-                write_be_u(self._fp, 4, value)
-            case Kind.S4:
-                write_be_s(self._fp, 4, value)
-            case Kind.U8:
-                write_be_u(self._fp, 8, value)
-            case Kind.S8:
-                write_be_s(self._fp, 8, value)
-            case Kind.F4:
-                write_be_f4(self._fp, value)
-            case Kind.F8:
-                write_be_f8(self._fp, value)
-            case Kind.Chars:
-                write_be_u(self._fp, 4, self._chars.add(value))
-            case Kind.Bytes:
-                write_be_u(self._fp, 4, self._bytes.add(value))
-                write_be_u(self._fp, 4, len(value))
-            case _:
-                raise Exception(kind)
-
-
-class _Reader:
-    def __init__(self, fp: BinaryIO):
-        self._fp = fp
-
-    def read(self) -> Table:
-        self._chars_encoding = CharsEncoding(read_any_be_u(self._fp, 2))
-        self._rows_offset = read_any_be_u(self._fp, 2)
-        self._strings_offset = read_any_be_u(self._fp, 4)
-        self._blobs_offset = read_any_be_u(self._fp, 4)
-        self._name_offset = read_any_be_u(self._fp, 4)
-        self._column_count = read_any_be_u(self._fp, 2)
-        self._row_size = read_any_be_u(self._fp, 2)
-        self._row_count = read_any_be_u(self._fp, 4)
-
-        match self._chars_encoding:
-            case CharsEncoding.CP932:
-                self._chars_encoding_name = "cp932"
-            case CharsEncoding.UTF8:
-                self._chars_encoding_name = "utf-8"
-            case _:
-                raise Exception(self._chars_encoding)
-
-        self._read_columns()
-        name = self._read_string(self._name_offset)
-        rows = []
-        for _ in range(self._row_count):
-            rows.append(self._read_row())
-        return Table(
-            spec=Spec(name, self._columns, self._chars_encoding),
-            rows=tuple(rows),
-        )
+        if isinstance(self._table, ColumnarTable):
+            self._write_columnar_rows()
+            return
+        rows = self._table.rows
+        codec = _compile_row(self._table.spec.columns, tuple(self._constants))
+        row = codec.row
+        get = codec.get
+        special = [
+            (i, column.kind)
+            for i, column in enumerate(codec.columns)
+            if column.kind in (Kind.Chars, Kind.Bytes)
+        ]
+
+        size = row.size
+        buffer = bytearray(size * len(rows))
+        if not size:
+            pass
+        elif not special:
+            for i, value in enumerate(rows):
+                row.pack_into(buffer, i * size, *get(value))
+        else:
+            for i, value in enumerate(rows):
+                values = list(get(value))
+                for position, kind in special:
+                    value = values[position]
+                    if kind == Kind.Chars:
+                        values[position] = self._chars.add(value)
+                    else:
+                        values[position] = (self._bytes.add(value) << 32) | len(value)
+                row.pack_into(buffer, i * size, *values)
+        self._out.write(buffer)
+        self._row_size = size if rows else 0
+
+    def _write_columnar_rows(self) -> None:
+        table = self._table
+        codec = _compile_row(table.spec.columns, tuple(self._constants))
+        size = codec.row.size
+        count = table.row_count
+        buffer = bytearray(size * count)
+
+        strings = [
+            (i, column.kind)
+            for i, column in enumerate(codec.columns)
+            if column.kind in (Kind.Chars, Kind.Bytes)
+        ]
+        offsets = [array(_array_codes[kind]) for _, kind in strings]
+        string_columns = [table.columns[codec.columns[i].name] for i, _ in strings]
+        for values in zip(*string_columns):
+            for value, (_, kind), column_offsets in zip(values, strings, offsets):
+                if kind == Kind.Chars:
+                    column_offsets.append(self._chars.add(value))
+                else:
+                    column_offsets.append((self._bytes.add(value) << 32) | len(value))
+        encoded = dict(zip((i for i, _ in strings), offsets))
+
+        position = 0
+        for i, column in enumerate(codec.columns):
+            width = struct.calcsize(">" + _struct_codes[column.kind])
+            values = encoded.get(i)
+            if values is None:
+                values = table.columns[column.name]
+            data = _pack_column(column.kind, values)
+            if width == size:
+                buffer[:] = data
+            else:
+                for k in range(width):
+                    buffer[position + k :: size] = data[k::width]
+            position += width
+        self._out.write(buffer)
+        self._row_size = size if count else 0
+
+
+def _find_constant(values: Sequence[Any]) -> Any | None:
+    if not len(values):
+        return None
+    first = values[0]
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        if not (values == first).all():
+            return None
+        return first.item()
+    if values.count(first) != len(values):
+        return None
+    return first
+
+
+def _pack_column(kind: Kind, values: Sequence[Any]) -> bytes:
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.astype(">" + _struct_codes[kind]).tobytes()
+    packed = array(_array_codes[kind], values)
+    if sys.byteorder == "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+_header = ">HHIIIHHI"
+
+_encoding_names = {
+    CharsEncoding.CP932: "cp932",
+    CharsEncoding.UTF8: "utf-8",
+}
 
-    def _read_columns(self) -> None:
-        columns: list[Column] = []
-        constants: list[Any | None] = []
-        for _ in range(self._column_count):
-            column, constant = self._read_column()
-            columns.append(column)
-            constants.append(constant)
-        self._columns = tuple(columns)
-        self._constants = tuple(constants)
 
-    def _read_column(self) -> tuple[Column, Any | None]:
-        info = read_any_be_u(self._fp, 1)
-        kind = Kind(info & 0xF)
-        storage = _Storage(info >> 4)
+class _LazyColumn(Sequence):
+    def __init__(self, table: "LazyTable", name: str):
+        self._table = table
+        self._name = name
 
-        name_offset = read_any_be_u(self._fp, 4)
-        name = self._read_string(name_offset)
+    def __len__(self) -> int:
+        return len(self._table)
 
-        if storage == _Storage.DEFAULT:
-            constant = _default_values[kind]
-        elif storage == _Storage.CONSTANT:
-            constant = self._read_value(kind)
-        elif storage == _Storage.NORMAL:
-            constant = None
-        else:
-            raise Exception(storage)
+    def __getitem__(self, index: int) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._table.value(index, self._name)
 
-        return Column(name, kind), constant
 
-    def _read_row(self) -> dict[str, Any]:
+class _LazyRows(Sequence):
+    def __init__(self, table: "LazyTable"):
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._table.row(index)
+
+
+class LazyTable:
+    def __init__(self, data: bytes | bytearray | memoryview):
+        view = memoryview(data)
+        self._view = view
+
+        reader = BinaryReader(view)
+        (
+            encoding,
+            self._rows_offset,
+            self._strings_offset,
+            self._blobs_offset,
+            name_offset,
+            column_count,
+            self._row_size,
+            self._row_count,
+        ) = reader.unpack(_header)
+        encoding = CharsEncoding(encoding)
+        self._encoding_name = _encoding_names[encoding]
+        self._strings = {}
+
+        columns = []
+        constants = []
+        for _ in range(column_count):
+            info, column_name_offset = reader.unpack(">BI")
+            kind = Kind(info & 0xF)
+            storage = _Storage(info >> 4)
+            if storage == _Storage.DEFAULT:
+                constant = _default_values[kind]
+            elif storage == _Storage.CONSTANT:
+                (raw,) = reader.unpack(">" + _struct_codes[kind])
+                constant = self._convert(kind, raw)
+            elif storage == _Storage.NORMAL:
+                constant = None
+            else:
+                raise Exception(storage)
+            columns.append(Column(self._string(column_name_offset), kind))
+            constants.append(constant)
+
+        self.spec = Spec(self._string(name_offset), tuple(columns), encoding)
+        self._constants = tuple(constants)
+        self._codec = _compile_row(
+            self.spec.columns,
+            tuple(constant is not None for constant in constants),
+        )
+        self._fields = {}
+        field_offset = 0
+        for column in self._codec.columns:
+            code = _struct_codes[column.kind]
+            self._fields[column.name] = (field_offset, column.kind, code)
+            field_offset += struct.calcsize(">" + code)
+        self._constant_values = {
+            column.name: constant
+            for column, constant in zip(columns, constants)
+            if constant is not None
+        }
+
+        rows_end = self._rows_offset + self._row_size * self._row_count
+        self._rows = view[self._rows_offset : rows_end]
+        if len(self._rows) != rows_end - self._rows_offset:
+            raise EOFError
+
+    def __len__(self) -> int:
+        return self._row_count
+
+    @property
+    def rows(self) -> Sequence[dict[str, Any]]:
+        return _LazyRows(self)
+
+    def row(self, index: int) -> dict[str, Any]:
+        index = self._check_index(index)
+        values = iter(self._codec.row.unpack_from(self._rows, index * self._row_size))
         row = {}
-        for column, constant in zip(self._columns, self._constants):
-            kind = column.kind
-            value = constant
-            if value is None:
-                value = self._read_value(kind)
-            row[column.name] = value
+        for column, constant in zip(self.spec.columns, self._constants):
+            if constant is None:
+                row[column.name] = self._convert(column.kind, next(values))
+            else:
+                row[column.name] = constant
         return row
 
-    def _read_value(self, kind: Kind) -> Any:
+    def value(self, index: int, name: str) -> Any:
+        index = self._check_index(index)
+        field = self._fields.get(name)
+        if field is None:
+            return self._constant_values[name]
+        offset, kind, code = field
+        (raw,) = struct.unpack_from(">" + code, self._rows, index * self._row_size + offset)
+        return self._convert(kind, raw)
+
+    def column(self, name: str) -> list[Any]:
+        field = self._fields.get(name)
+        if field is None:
+            return [self._constant_values[name]] * self._row_count
+        offset, kind, code = field
+        if not self._row_count:
+            return []
+        width = struct.calcsize(">" + code)
+        if width == self._row_size:
+            reader = BinaryReader(self._rows)
+            raw = reader.read_array(_array_codes[kind], self._row_count).tolist()
+        else:
+            padding = self._row_size - offset - width
+            layout = struct.Struct(f">{offset}x{code}{padding}x")
+            raw = [value for (value,) in layout.iter_unpack(self._rows)]
+        match kind:
+            case Kind.Chars:
+                return list(map(self._string, raw))
+            case Kind.Bytes:
+                return list(map(self._packed_blob, raw))
+            case _:
+                return raw
+
+    def column_view(self, name: str) -> Sequence[Any]:
+        if name not in self._fields and name not in self._constant_values:
+            raise KeyError(name)
+        return _LazyColumn(self, name)
+
+    def to_table(self) -> Table:
+        columns = [self.column(column.name) for column in self.spec.columns]
+        names = [column.name for column in self.spec.columns]
+        if not names:
+            rows = tuple({} for _ in range(self._row_count))
+        else:
+            rows = tuple(dict(zip(names, values)) for values in zip(*columns))
+        return Table(spec=self.spec, rows=rows)
+
+    def _check_index(self, index: int) -> int:
+        if index < 0:
+            index += self._row_count
+        if not 0 <= index < self._row_count:
+            raise IndexError(index)
+        return index
+
+    def _convert(self, kind: Kind, raw: Any) -> Any:
         match kind:
-            case Kind.U1:
-                return read_any_be_u(self._fp, 1)
-            case Kind.S1:
-                return read_any_be_s(self._fp, 1)
-            case Kind.U2:
-                return read_any_be_u(self._fp, 2)
-            case Kind.S2:
-                return read_any_be_s(self._fp, 2)
-            case Kind.U4:
-                return read_any_be_u(self._fp, 4)
-            case Kind.S4:
-                return read_any_be_s(self._fp, 4)
-            case Kind.U8:
-                return read_any_be_u(self._fp, 8)
-            case Kind.S8:
-                return read_any_be_s(self._fp, 8)
-            case Kind.F4:
-                return read_any_be_f4(self._fp)
-            case Kind.F8:
-                return read_any_be_f8(self._fp)
             case Kind.Chars:
-                return self._read_string(
-                    read_any_be_u(self._fp, 4),
-                )
+                return self._string(raw)
             case Kind.Bytes:
-                return self._read_blob(
-                    read_any_be_u(self._fp, 4),
-                    read_any_be_u(self._fp, 4),
-                )
+                return self._packed_blob(raw)
             case _:
-                raise Exception(kind)
+                return raw
 
-    def _read_string(self, offset: int) -> str:
+    def _string(self, offset: int) -> str:
         if offset == 0:
             return ""
-        buffer = bytearray()
-        tmp = self._fp.tell()
-        self._fp.seek(self._strings_offset + offset)
+        value = self._strings.get(offset)
+        if value is not None:
+            return value
+        start = self._strings_offset + offset
+        size = 64
         while True:
-            b = read_any_be_u(self._fp, 1)
-            if b == 0x00:
+            chunk = bytes(self._view[start : start + size])
+            end = chunk.find(b"\x00")
+            if end >= 0:
                 break
-            buffer.append(b)
-        self._fp.seek(tmp)
-        return buffer.decode(self._chars_encoding_name)
-
-    def _read_blob(self, offset: int, length: int) -> bytes:
-        tmp = self._fp.tell()
-        self._fp.seek(self._blobs_offset + offset)
-        value = read_any_bytes(self._fp, length)
-        self._fp.seek(tmp)
+            if start + size >= len(self._view):
+                raise EOFError
+            size *= 4
+        value = chunk[:end].decode(self._encoding_name)
+        self._strings[offset] = value
         return value
 
-
-def _write_wrapper(fp: BinaryIO, data: bytes) -> None:
-    write_bytes(fp, b"@UTF")
-    write_be_u(fp, 4, len(data))
-    write_bytes(fp, data)
+    def _packed_blob(self, value: int) -> bytes:
+        offset = self._blobs_offset + (value >> 32)
+        length = value & 0xFFFFFFFF
+        blob = bytes(self._view[offset : offset + length])
+        if len(blob) != length:
+            raise EOFError
+        return blob
 
 
 def _read_wrapper(fp: BinaryIO) -> bytes:
-    read_bytes(fp, b"@UTF")
-    length = read_any_be_u(fp, 4)
+    header = BinaryReader(read_any_bytes(fp, 8))
+    header.expect(b"@UTF")
+    (length,) = header.unpack(">I")
     return read_any_bytes(fp, length)
 
 
-def write(fp: BinaryIO, table: Table) -> None:
-    buffer = BytesIO()
-    _Writer(buffer, table).write()
-    _write_wrapper(fp, buffer.getvalue())
+def write(
+    fp: BinaryIO,
+    table: Table | ColumnarTable,
+    dedupe: bool = True,
+    share_suffixes: bool = False,
+) -> None:
+    write_bytes(fp, encode(table, dedupe, share_suffixes))
+
+
+def _unwrap(data: bytes | bytearray | memoryview) -> memoryview:
+    view = memoryview(data)
+    magic = bytes(view[:4])
+    if magic != b"@UTF":
+        raise ValueError(f"expected {b'@UTF'!r}, got {magic!r}")
+    if len(view) < 8:
+        raise EOFError
+    length = int.from_bytes(view[4:8], "big")
+    view = view[8 : 8 + length]
+    if len(view) != length:
+        raise EOFError
+    return view
 
 
 def read(fp: BinaryIO) -> Table:
-    buffer = BytesIO(_read_wrapper(fp))
-    return _Reader(buffer).read()
+    return LazyTable(_read_wrapper(fp)).to_table()
 
 
-def encode(table: Table) -> bytes:
-    buffer = BytesIO()
-    write(buffer, table)
-    return buffer.getvalue()
+def encode(
+    table: Table | ColumnarTable,
+    dedupe: bool = True,
+    share_suffixes: bool = False,
+) -> bytes:
+    out = BinaryWriter()
+    out.write(b"@UTF")
+    length_slot = out.reserve(">I")
+    _Writer(out, table, dedupe, share_suffixes).write()
+    out.patch(length_slot, ">I", out.position - length_slot - 4)
+    return out.getvalue()
 
 
 def decode(data: bytes) -> Table:
-    return read(BytesIO(data))
+    return decode_lazy(data).to_table()
+
+
+def decode_lazy(data: bytes | bytearray | memoryview) -> LazyTable:
+    return LazyTable(_unwrap(data))
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+import posixpath
+from typing import Sequence
+
+from lib.toolutils import load_json
+
+
+@dataclass(frozen=True)
+class Access:
+    name: str
+    time: float
+
+
+@dataclass(frozen=True)
+class SeekScore:
+    accesses: int
+    seeks: int
+    distance: int
+
+
+def load_trace(path: str) -> list[Access]:
+    trace = [Access(value["name"], value["time"]) for value in load_json(path)]
+    trace.sort(key=lambda x: x.time)
+    return trace
+
+
+def order_entries(
+    names: Sequence[str], policy: str | None, trace: list[Access] | None, gap: float
+) -> list[str]:
+    match policy:
+        case None:
+            order = list(names)
+        case "stem":
+            order = order_by_stem(names)
+        case _:
+            raise ValueError(f"unknown layout policy: {policy!r}")
+    if trace is not None:
+        order = order_by_trace(order, trace, gap)
+    return order
+
+
+def order_by_stem(names: Sequence[str]) -> list[str]:
+    groups = {}
+    for name in names:
+        stem = posixpath.splitext(posixpath.basename(name.replace("\\", "/")))[0]
+        groups.setdefault(stem, []).append(name)
+    return [name for group in groups.values() for name in group]
+
+
+def order_by_trace(names: Sequence[str], trace: list[Access], gap: float) -> list[str]:
+    known = set(names)
+    first = {}
+    weights = {}
+    previous = None
+    for access in trace:
+        if access.name not in known:
+            continue
+        first.setdefault(access.name, access.time)
+        if (
+            previous is not None
+            and previous.name != access.name
+            and access.time - previous.time <= gap
+        ):
+            edge = (previous.name, access.name)
+            weights[edge] = weights.get(edge, 0) + 1
+        previous = access
+
+    chains = {name: [name] for name in first}
+    edges = sorted(weights.items(), key=lambda x: (-x[1], first[x[0][0]]))
+    for (a, b), _ in edges:
+        head = chains[a]
+        tail = chains[b]
+        if head is tail or head[-1] != a or tail[0] != b:
+            continue
+        head.extend(tail)
+        for name in tail:
+            chains[name] = head
+
+    unique = {id(chain): chain for chain in chains.values()}.values()
+    order = [
+        name
+        for chain in sorted(unique, key=lambda x: min(first[name] for name in x))
+        for name in chain
+    ]
+    order.extend(name for name in names if name not in first)
+    return order
+
+
+def count_seeks(
+    extents: dict[str, tuple[int, int]], trace: list[Access], slack: int
+) -> SeekScore:
+    accesses = 0
+    seeks = 0
+    distance = 0
+    position = None
+    previous = None
+    for access in trace:
+        if access.name == previous or access.name not in extents:
+            continue
+        previous = access.name
+        offset, size = extents[access.name]
+        accesses += 1
+        if position is None or not 0 <= offset - position <= slack:
+            seeks += 1
+            if position is not None:
+                distance += abs(offset - position)
+        position = offset + size
+    return SeekScore(accesses, seeks, distance)
+
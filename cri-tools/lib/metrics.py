@@ -0,0 +1,116 @@
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+import sys
+from time import perf_counter
+from typing import Any, ContextManager, Iterator, TextIO
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+@dataclass
+class Phase:
+    seconds: float = 0.0
+    count: int = 0
+    size: int = 0
+
+
+class Metrics:
+    def __init__(self, record_entries: bool = True):
+        self.phases = {}
+        self.entries = []
+        self.record_entries = record_entries
+        self._start = perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, size: int = 0) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start, size)
+
+    def add(self, name: str, seconds: float, size: int = 0) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        phase.seconds += seconds
+        phase.count += 1
+        phase.size += size
+
+    def add_entry(self, entry: dict[str, Any], seconds: float, size: int) -> None:
+        self.entries.append(
+            {**entry, "seconds": seconds, "mb_per_s": _mb_per_s(size, seconds)}
+        )
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "seconds": perf_counter() - self._start,
+            "peak_rss": peak_rss(),
+            "phases": {
+                name: {
+                    "seconds": phase.seconds,
+                    "count": phase.count,
+                    "bytes": phase.size,
+                    "mb_per_s": _mb_per_s(phase.size, phase.seconds),
+                }
+                for name, phase in self.phases.items()
+            },
+            "entries": self.entries,
+        }
+
+
+def phase(metrics: Metrics | None, name: str, size: int = 0) -> ContextManager:
+    if metrics is None:
+        return nullcontext()
+    return metrics.phase(name, size)
+
+
+def peak_rss() -> int | None:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return usage
+    return usage * 1024
+
+
+class Progress:
+    def __init__(self, total: int, stream: TextIO, interval: float = 0.25):
+        self._total = total
+        self._stream = stream
+        self._interval = interval
+        self._start = perf_counter()
+        self._last = None
+        self.count = 0
+        self.size = 0
+
+    def update(self, size: int) -> None:
+        self.count += 1
+        self.size += size
+        now = perf_counter()
+        if self._last is not None and now - self._last < self._interval:
+            return
+        self._last = now
+        self._write(now)
+
+    def finish(self) -> None:
+        self._write(perf_counter())
+        self._stream.write("\n")
+        self._stream.flush()
+
+    def _write(self, now: float) -> None:
+        megabytes = self.size / (1024 * 1024)
+        self._stream.write(
+            f"\r{self.count}/{self._total} files, {megabytes:.1f} MB,"
+            f" {_mb_per_s(self.size, now - self._start):.1f} MB/s"
+        )
+        self._stream.flush()
+
+
+def _mb_per_s(size: int, seconds: float) -> float:
+    if not size or seconds <= 0:
+        return 0.0
+    return size / (1024 * 1024) / seconds
@@ -0,0 +1,17 @@
+import os
+
+from lib.cri.patch import apply
+from lib.toolutils import hash_file
+
+
+def run(old: str, patch: str, archive: str, verify: bool) -> None:
+    with open(old, "rb") as old_fp, open(patch, "rb") as patch_fp:
+        try:
+            with open(archive, "wb") as archive_fp:
+                target = apply(old_fp, patch_fp, archive_fp)
+        except Exception:
+            os.remove(archive)
+            raise
+    if verify and hash_file(archive) != target["digest"]:
+        raise Exception("patched archive does not match the target digest")
+    print("Wrote", target["size"], "bytes into", archive)
@@ -0,0 +1,105 @@
+import os
+import random
+from time import perf_counter
+from typing import Callable
+
+from lib.cri.crilayla import compress, decompress
+
+_window = 0x1FFF + 3
+
+
+def _decompress_loop(data: bytes) -> bytes:
+    size = int.from_bytes(data[8:12], "little")
+    header_offset = int.from_bytes(data[12:16], "little") + 16
+    out = bytearray(size + 0x100)
+    out[:0x100] = data[header_offset : header_offset + 0x100]
+    offset = header_offset - 1
+    pool = 0
+    left = 0
+
+    def bits(count: int) -> int:
+        nonlocal offset, pool, left
+        value = 0
+        for _ in range(count):
+            if left == 0:
+                pool = data[offset]
+                offset -= 1
+                left = 8
+            left -= 1
+            value = (value << 1) | ((pool >> left) & 1)
+        return value
+
+    p = size + 0x100 - 1
+    while p >= 0x100:
+        if not bits(1):
+            out[p] = bits(8)
+            p -= 1
+            continue
+        source = p + bits(13) + 3
+        length = 3
+        for width in (2, 3, 5, 8):
+            value = bits(width)
+            length += value
+            if value != (1 << width) - 1:
+                break
+        else:
+            while True:
+                value = bits(8)
+                length += value
+                if value != 0xFF:
+                    break
+        for _ in range(length):
+            out[p] = out[source]
+            p -= 1
+            source -= 1
+    return bytes(out)
+
+
+def _make_long(size: int) -> bytes:
+    block = os.urandom(_window)
+    return (block * (size // _window + 1))[:size]
+
+
+def _make_mixed(size: int) -> bytes:
+    rng = random.Random(size)
+    words = [os.urandom(rng.randrange(2, 12)) for _ in range(512)]
+    parts = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.1:
+            part = os.urandom(rng.randrange(1, 8))
+        else:
+            part = rng.choice(words)
+        parts.append(part)
+        total += len(part)
+    return b"".join(parts)[:size]
+
+
+def _measure(function: Callable[[bytes], bytes], data: bytes, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function(data)
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(size: int, repeat: int) -> None:
+    megabytes = size / (1024 * 1024)
+    for name, data in (("long", _make_long(size)), ("mixed", _make_mixed(size))):
+        compressed = compress(data)
+        if compressed is None:
+            raise Exception(f"{name} corpus did not compress")
+        if decompress(compressed) != data:
+            raise Exception("decompress output does not match the input")
+        if _decompress_loop(compressed) != data:
+            raise Exception("reference loop output does not match the input")
+
+        loop_time = _measure(_decompress_loop, compressed, repeat)
+        fast_time = _measure(decompress, compressed, repeat)
+        print(f"{name}: {size} -> {len(compressed)} bytes")
+        print(f"  loop:       {loop_time * 1000:10.3f} ms  {megabytes / loop_time:10.1f} MB/s")
+        print(f"  decompress: {fast_time * 1000:10.3f} ms  {megabytes / fast_time:10.1f} MB/s")
+        print(f"  speedup: {loop_time / fast_time:.1f}x")
@@ -0,0 +1,40 @@
+import os
+from time import perf_counter
+from typing import Callable
+
+from lib.cri.crypt import crypt
+
+
+def _crypt_loop(data: bytes) -> bytes:
+    buffer = bytearray(data)
+    key = 0x5F
+    for i in range(len(data)):
+        buffer[i] ^= key
+        key = (key * 0x15) & 0xFF
+    return bytes(buffer)
+
+
+def _measure(function: Callable[[bytes], bytes], data: bytes, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function(data)
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(size: int, repeat: int) -> None:
+    data = os.urandom(size)
+    if crypt(data) != _crypt_loop(data):
+        raise Exception("crypt output does not match the reference loop")
+    if crypt(crypt(data)) != data:
+        raise Exception("crypt is not symmetric")
+
+    loop_time = _measure(_crypt_loop, data, repeat)
+    fast_time = _measure(crypt, data, repeat)
+    megabytes = size / (1024 * 1024)
+    print(f"loop:  {loop_time * 1000:10.3f} ms  {megabytes / loop_time:10.1f} MB/s")
+    print(f"crypt: {fast_time * 1000:10.3f} ms  {megabytes / fast_time:10.1f} MB/s")
+    print(f"speedup: {loop_time / fast_time:.1f}x")
@@ -0,0 +1,273 @@
+from contextlib import redirect_stdout
+import io
+import os
+import random
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from lib.cri.cpk import Config, Reader, Writer
+from lib.cri.crilayla import compress, decompress
+from lib.cri.crypt import crypt
+from lib.cri.table import (
+    CharsEncoding,
+    Column,
+    ColumnarTable,
+    Kind,
+    Spec,
+    Table,
+    decode,
+    decode_lazy,
+    encode,
+)
+from lib.toolutils import ensure_directory, load_json, save_json
+from lib.tools import create_archive
+
+_table_spec = Spec(
+    name="BenchmarkTable",
+    columns=(
+        Column("DirName", Kind.Chars),
+        Column("FileName", Kind.Chars),
+        Column("FileSize", Kind.U4),
+        Column("ExtractSize", Kind.U4),
+        Column("FileOffset", Kind.U8),
+        Column("ID", Kind.U4),
+        Column("UserString", Kind.Chars),
+    ),
+    string_encoding=CharsEncoding.CP932,
+)
+
+_small_directories = ("bg", "voice")
+_small_extensions = {"bg": ".webp", "voice": ".ogg"}
+
+
+def run(
+    output: str,
+    baseline: str | None,
+    tolerance: float,
+    repeat: int,
+    max_rows: int,
+    small_files: int,
+    small_size: int,
+    movie_files: int,
+    movie_size: int,
+    work_directory: str | None,
+) -> None:
+    workload = {
+        "repeat": repeat,
+        "max-rows": max_rows,
+        "small-files": small_files,
+        "small-size": small_size,
+        "movie-files": movie_files,
+        "movie-size": movie_size,
+    }
+    previous = None
+    if baseline is not None:
+        previous = load_json(baseline)
+        if previous.get("workload") != workload:
+            raise ValueError("baseline was measured on a different workload")
+
+    results = {}
+
+    rows = 1000
+    while rows <= max_rows:
+        _bench_table(results, rows, repeat)
+        rows *= 10
+
+    data = random.Random(0).randbytes(16 * 1024 * 1024)
+    results["crypt"] = _result(_measure(lambda: crypt(data), repeat), len(data))
+
+    text = _make_text(1024 * 1024)
+    compressed = compress(text)
+    results["crilayla_compress"] = _result(
+        _measure(lambda: compress(text), 1), len(text)
+    )
+    results["crilayla_decompress"] = _result(
+        _measure(lambda: decompress(compressed), repeat), len(text)
+    )
+
+    with tempfile.TemporaryDirectory(dir=work_directory) as temp:
+        directory = os.path.join(temp, "c0data")
+        archive = os.path.join(temp, "c0data.cpk")
+        size = _make_tree(directory, small_files, small_size, movie_files, movie_size)
+        meta = load_json(os.path.join(directory, "_meta.json"))
+        config = Config(
+            alignment=meta["alignment"],
+            encrypt_tables=meta["encrypt-tables"],
+            randomize_padding=meta["randomize-padding"],
+        )
+
+        results["writer_write_file"] = _result(
+            _measure(lambda: _write_tree(directory, archive, meta, config), 1), size
+        )
+
+        def read_tree() -> None:
+            with open(archive, "rb") as fp:
+                reader = Reader(fp)
+                for entry in meta["entries"]:
+                    reader.find(entry["name"])
+                reader.close()
+
+        results["reader_find"] = _result(_measure(read_tree, repeat), 0)
+
+        def build() -> None:
+            with redirect_stdout(io.StringIO()):
+                create_archive.run(directory, archive, progress=False)
+
+        results["create_archive"] = _result(_measure(build, 1), size)
+
+    report = {"workload": workload, "stages": results}
+    save_json(output, report)
+    for name, result in results.items():
+        line = f"{name:32} {result['seconds'] * 1000:12.3f} ms"
+        if result["bytes"]:
+            line += f"  {result['mb_per_s']:10.1f} MB/s"
+        print(line)
+
+    if previous is not None:
+        _compare(previous["stages"], results, tolerance)
+
+
+def _bench_table(results: dict[str, Any], rows: int, repeat: int) -> None:
+    table = _make_table(rows)
+    columnar = ColumnarTable.from_rows(table.spec, table.rows)
+    data = encode(table)
+    results[f"table_encode_{rows}"] = _result(
+        _measure(lambda: encode(table), repeat), len(data)
+    )
+    results[f"table_encode_columnar_{rows}"] = _result(
+        _measure(lambda: encode(columnar), repeat), len(data)
+    )
+    results[f"table_decode_{rows}"] = _result(
+        _measure(lambda: decode(data), repeat), len(data)
+    )
+    results[f"table_decode_lazy_{rows}"] = _result(
+        _measure(lambda: decode_lazy(data).column("FileOffset"), repeat), len(data)
+    )
+
+
+def _make_table(rows: int) -> Table:
+    rng = random.Random(rows)
+    offset = 0
+    values = []
+    for i in range(rows):
+        size = rng.randrange(1, 1 << 20)
+        directory = _small_directories[i % len(_small_directories)]
+        values.append(
+            {
+                "DirName": "",
+                "FileName": f"{directory}_{i:07d}{_small_extensions[directory]}",
+                "FileSize": size,
+                "ExtractSize": size,
+                "FileOffset": offset,
+                "ID": i,
+                "UserString": "",
+            }
+        )
+        offset += size + -size % 2048
+    return Table(_table_spec, tuple(values))
+
+
+def _make_text(size: int) -> bytes:
+    rng = random.Random(size)
+    words = [rng.randbytes(rng.randrange(2, 12)) for _ in range(512)]
+    parts = []
+    total = 0
+    while total < size:
+        part = rng.choice(words)
+        parts.append(part)
+        total += len(part)
+    return b"".join(parts)[:size]
+
+
+def _make_tree(
+    directory: str,
+    small_files: int,
+    small_size: int,
+    movie_files: int,
+    movie_size: int,
+) -> int:
+    rng = random.Random(0)
+    entries = []
+    total = 0
+    for i in range(small_files):
+        sub = _small_directories[i % len(_small_directories)]
+        name = f"{sub}_{i:07d}{_small_extensions[sub]}"
+        size = rng.randrange(small_size // 2, small_size * 3 // 2 + 1)
+        entries.append((sub, name, rng.randbytes(size)))
+    chunk = rng.randbytes(1024 * 1024)
+    for i in range(movie_files):
+        entries.append(("movie", f"movie_{i:02d}.usm", None))
+
+    ensure_directory(directory)
+    meta_entries = []
+    for id_, (sub, name, data) in enumerate(entries):
+        ensure_directory(os.path.join(directory, sub))
+        path = os.path.join(directory, sub, name)
+        with open(path, "wb") as fp:
+            if data is None:
+                for _ in range(movie_size // len(chunk)):
+                    fp.write(chunk)
+                fp.write(chunk[: movie_size % len(chunk)])
+                total += movie_size
+            else:
+                fp.write(data)
+                total += len(data)
+        meta_entries.append({"name": name, "path": f"{sub}/{name}", "id": id_})
+
+    save_json(
+        os.path.join(directory, "_meta.json"),
+        {
+            "alignment": 2048,
+            "encrypt-tables": False,
+            "randomize-padding": False,
+            "entries": meta_entries,
+        },
+    )
+    return total
+
+
+def _write_tree(directory: str, archive: str, meta: Any, config: Config) -> None:
+    with open(archive, "wb") as archive_fp:
+        writer = Writer(archive_fp, config)
+        for entry in meta["entries"]:
+            with open(os.path.join(directory, entry["path"]), "rb") as fp:
+                writer.write_file(entry["id"], entry["name"], fp)
+        writer.close()
+
+
+def _measure(function: Callable[[], Any], repeat: int) -> float:
+    best = None
+    for _ in range(max(repeat, 1)):
+        start = perf_counter()
+        function()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _result(seconds: float, size: int) -> dict[str, Any]:
+    return {
+        "seconds": seconds,
+        "bytes": size,
+        "mb_per_s": size / (1024 * 1024) / seconds if size and seconds else 0.0,
+    }
+
+
+def _compare(
+    baseline: dict[str, Any], results: dict[str, Any], tolerance: float
+) -> None:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name]["seconds"] * (1 + tolerance)
+        if result["seconds"] > limit:
+            regressions.append(name)
+            print(
+                f"regression: {name} took {result['seconds'] * 1000:.3f} ms,",
+                f"baseline {baseline[name]['seconds'] * 1000:.3f} ms",
+            )
+    if regressions:
+        raise Exception(f"{len(regressions)} stages regressed")
@@ -0,0 +1,147 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+import os
+import sys
+from threading import Lock
+from time import perf_counter
+from typing import Any, TextIO
+
+from lib.metrics import Metrics, peak_rss
+from lib.tools.create_archive import BuildOptions, Pools, build
+from lib.toolutils import load_json, save_json
+
+
+class _PrefixedOutput:
+    def __init__(self, prefix: str, stream: TextIO, lock: Lock):
+        self._prefix = prefix
+        self._stream = stream
+        self._lock = lock
+        self._pending = ""
+
+    def write(self, text: str) -> int:
+        self._pending += text
+        *lines, self._pending = self._pending.split("\n")
+        if lines:
+            with self._lock:
+                for line in lines:
+                    self._stream.write(f"{self._prefix}{line}\n")
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._stream.flush()
+
+
+def run(
+    specs: str,
+    parallel: int,
+    workers: int,
+    memory_budget: int,
+    direct_size: int,
+    compression_workers: int,
+    metrics: str | None,
+) -> None:
+    root = os.path.dirname(specs)
+    jobs = [_resolve(root, job) for job in load_json(specs)]
+    archives = [os.path.normpath(job["archive"]) for job in jobs]
+    if len(set(archives)) != len(archives):
+        raise ValueError("several specs write the same archive")
+    parallel = min(parallel, len(jobs)) if parallel > 0 else len(jobs)
+
+    start = perf_counter()
+    lock = Lock()
+    compressor = (
+        ProcessPoolExecutor(compression_workers)
+        if compression_workers > 0
+        else nullcontext()
+    )
+    with ThreadPoolExecutor(max(workers, 1)) as executor, compressor as compression:
+        pools = Pools(executor, compression)
+        with ThreadPoolExecutor(max(parallel, 1)) as builders:
+            futures = [
+                builders.submit(
+                    _build_job,
+                    job,
+                    memory_budget // max(parallel, 1),
+                    workers,
+                    direct_size,
+                    compression_workers,
+                    pools,
+                    lock,
+                )
+                for job in jobs
+            ]
+            results = []
+            failures = []
+            for job, future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failures.append(f"{job['archive']}: {e!r}")
+
+    seconds = perf_counter() - start
+    for result in results:
+        print(
+            f"{result['archive']}: {result['seconds']:.2f} s,",
+            result["bytes"], "bytes",
+            f"({result['mb_per_s']:.1f} MB/s)",
+        )
+    print(
+        f"Built {len(results)} archives in {seconds:.2f} s",
+        f"({sum(result['seconds'] for result in results):.2f} s of archive time)",
+    )
+    if metrics is not None:
+        save_json(
+            metrics,
+            {"seconds": seconds, "peak_rss": peak_rss(), "archives": results},
+        )
+    for failure in failures:
+        print("Failed:", failure)
+    if failures:
+        raise Exception(f"{len(failures)} archives failed")
+
+
+def _build_job(
+    job: dict[str, Any],
+    memory_budget: int,
+    workers: int,
+    direct_size: int,
+    compression_workers: int,
+    pools: Pools,
+    lock: Lock,
+) -> dict[str, Any]:
+    collected = Metrics(False)
+    archive = job["archive"]
+    output = _PrefixedOutput(f"[{os.path.basename(archive)}] ", sys.stdout, lock)
+    options = BuildOptions(
+        workers=workers,
+        memory_budget=memory_budget,
+        direct_size=direct_size,
+        incremental=job.get("incremental", False),
+        compression_workers=compression_workers,
+        stream=job.get("stream", False),
+        progress=False,
+        verbose=job.get("verbose", False),
+        base=job.get("base"),
+    )
+    build(job["directory"], archive, options, collected, output, pools)
+    output.flush()
+    report = collected.report()
+    seconds = report["seconds"]
+    size = os.path.getsize(archive)
+    return {
+        "directory": job["directory"],
+        "archive": archive,
+        "seconds": seconds,
+        "bytes": size,
+        "mb_per_s": size / (1024 * 1024) / seconds if seconds > 0 else 0.0,
+        "phases": report["phases"],
+    }
+
+
+def _resolve(root: str, job: dict[str, Any]) -> dict[str, Any]:
+    job = dict(job)
+    for key in ("directory", "archive", "base"):
+        if key in job:
+            job[key] = os.path.join(root, job[key])
+    return job
@@ -1,22 +1,828 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
 import os
+import posixpath
+import sys
+from time import perf_counter
+from typing import Any, BinaryIO, Iterable, Iterator, TextIO
+import zlib
 
-from lib.cri.cpk import Config, Writer
-from lib.toolutils import load_json
+from lib.crcutils import crc32_file
+from lib.cri.cpk import (
+    Config,
+    Entry,
+    FileReport,
+    Plan,
+    PlannedFile,
+    Planner,
+    Reader,
+    StreamWriter,
+    Updater,
+    Writer,
+)
+from lib.cri.crilayla import compress, looks_compressible
+from lib.cri.padding import Padder
+from lib.layout import load_trace, order_entries
+from lib.metrics import Metrics, Progress
+from lib.toolutils import hash_bytes, hash_file, load_bytes, load_json, save_json
 
+_direct_lookahead = 2
 
-def run(directory: str, archive: str) -> None:
+
+@dataclass(frozen=True)
+class Pools:
+    io: Executor
+    compression: Executor | None
+
+
+@dataclass(frozen=True)
+class BuildOptions:
+    workers: int = 4
+    memory_budget: int = 256 * 1024 * 1024
+    direct_size: int = 4 * 1024 * 1024
+    incremental: bool = False
+    compression_workers: int = os.cpu_count() or 1
+    stream: bool = False
+    dry_run: bool = False
+    progress: bool = True
+    verbose: bool = False
+    base: str | None = None
+
+
+@dataclass
+class _Source:
+    entry: dict[str, Any]
+    fp: BinaryIO
+    digest: str | None
+    extract_size: int | None
+
+
+@dataclass
+class _Measured:
+    entry: dict[str, Any]
+    path: str
+    size: int
+    digest: str | None
+    extract_size: int | None
+    data: bytes | None
+
+
+class _Log:
+    def __init__(
+        self, stream: TextIO, metrics: Metrics, progress: bool, verbose: bool
+    ):
+        self.stream = stream
+        self.metrics = metrics
+        self._show_progress = progress and not verbose
+        self._verbose = verbose
+        self._progress = None
+
+    def start(self, total: int) -> None:
+        if self._show_progress:
+            self._progress = Progress(total, sys.stderr)
+
+    def file(self, *args: Any) -> None:
+        if self._verbose:
+            print(*args, file=self.stream)
+
+    def message(self, *args: Any) -> None:
+        print(*args, file=self.stream)
+
+    def on_file(self, report: FileReport) -> None:
+        if self._progress is not None:
+            self._progress.update(report.size)
+
+    def finish(self) -> None:
+        if self._progress is not None:
+            self._progress.finish()
+            self._progress = None
+
+
+def run(
+    directory: str,
+    archive: str,
+    workers: int = BuildOptions.workers,
+    memory_budget: int = BuildOptions.memory_budget,
+    direct_size: int = BuildOptions.direct_size,
+    incremental: bool = False,
+    compression_workers: int = BuildOptions.compression_workers,
+    stream: bool = False,
+    dry_run: bool = False,
+    metrics: str | None = None,
+    progress: bool = True,
+    verbose: bool = False,
+    base: str | None = None,
+) -> None:
+    options = BuildOptions(
+        workers=workers,
+        memory_budget=memory_budget,
+        direct_size=direct_size,
+        incremental=incremental,
+        compression_workers=compression_workers,
+        stream=stream,
+        dry_run=dry_run,
+        progress=progress,
+        verbose=verbose,
+        base=base,
+    )
+    collected = Metrics(metrics is not None)
+    build(
+        directory,
+        archive,
+        options,
+        collected,
+        sys.stderr if archive == "-" else sys.stdout,
+    )
+    if metrics is not None:
+        save_json(metrics, collected.report())
+
+
+def build(
+    directory: str,
+    archive: str,
+    options: BuildOptions,
+    metrics: Metrics,
+    output: TextIO,
+    pools: Pools | None = None,
+) -> None:
+    log = _Log(output, metrics, options.progress, options.verbose)
+    _build(directory, archive, options, log, pools)
+
+
+def _build(
+    directory: str,
+    archive: str,
+    options: BuildOptions,
+    log: _Log,
+    pools: Pools | None,
+) -> None:
     meta = load_json(os.path.join(directory, "_meta.json"))
+    manifest_path = archive + ".manifest.json"
+    incremental = options.incremental
+    if options.base is not None:
+        if options.stream or options.dry_run or incremental or archive == "-":
+            raise ValueError("repacks cannot be streamed or incremental")
+        _remove_manifest(manifest_path)
+        _repack(directory, archive, options.base, meta, options, log, pools)
+        return
+
+    config = Config(
+        alignment=meta["alignment"],
+        encrypt_tables=meta["encrypt-tables"],
+        randomize_padding=meta["randomize-padding"],
+        dedupe_tables=meta.get("dedupe-tables", True),
+        share_string_suffixes=meta.get("share-string-suffixes", False),
+        deduplicate_entries=meta.get("deduplicate-entries", False),
+        file_crcs=meta.get("file-crcs", False),
+        padding_seed=meta.get("padding-seed"),
+    )
+    policy = meta.get("compression", {})
+    if "layout" in meta:
+        with log.metrics.phase("layout"):
+            meta["entries"] = _order_entries(directory, meta["entries"], meta["layout"])
+
+    if options.stream or options.dry_run or archive == "-":
+        if incremental:
+            raise ValueError("incremental builds cannot be streamed")
+        if not options.dry_run and archive != "-":
+            _remove_manifest(manifest_path)
+        _stream(directory, archive, config, meta, options, log, pools)
+        return
+
+    manifest = None
+    if incremental:
+        manifest = _load_manifest(manifest_path, archive, config)
+    _remove_manifest(manifest_path)
+    if manifest is not None:
+        records = _update(
+            directory, archive, config, meta, manifest, options, log, pools
+        )
+        if records is not None:
+            _save_manifest(manifest_path, config, records)
+            return
+        log.message("Archive does not match its manifest, rebuilding")
+
+    records = []
+    log.start(len(meta["entries"]))
     with open(archive, "wb") as archive_fp:
-        writer = Writer(
-            archive_fp,
-            Config(
-                alignment=meta["alignment"],
-                encrypt_tables=meta["encrypt-tables"],
-                randomize_padding=meta["randomize-padding"],
-            ),
+        writer = Writer(archive_fp, config, log.metrics, log.on_file)
+        sources = _open_entries(
+            directory,
+            meta["entries"],
+            policy,
+            options,
+            incremental or config.deduplicate_entries,
+            pools,
         )
-        for entry in meta["entries"]:
-            with open(os.path.join(directory, entry["path"]), "rb") as file_fp:
-                writer.write_file(entry["id"], entry["name"], file_fp)
-                print("Wrote file", entry["id"],":", entry["name"], "into c0data.cpk")
+        for source in _timed(log.metrics, "read", sources):
+            entry = source.entry
+            with source.fp:
+                report = writer.write_file(
+                    entry["id"],
+                    entry["name"],
+                    source.fp,
+                    source.digest,
+                    source.extract_size,
+                )
+            if incremental:
+                with log.metrics.phase("scan"):
+                    record = _make_record(directory, entry, policy, report.offset)
+                record["hash"] = source.digest
+                records.append(record)
+            log.file(
+                "Wrote file", entry["id"], ":", entry["name"], "into c0data.cpk",
+                f"({_describe(report)})",
+            )
         writer.close()
+    log.finish()
+    if config.deduplicate_entries:
+        log.message("Deduplicated", writer.deduplicated_size, "bytes")
+    _report_padding(log, writer.padding)
+
+    if incremental:
+        _save_manifest(manifest_path, config, records)
+
+
+def _update(
+    directory: str,
+    archive: str,
+    config: Config,
+    meta: Any,
+    manifest: Any,
+    options: BuildOptions,
+    log: _Log,
+    pools: Pools | None,
+) -> list[dict[str, Any]] | None:
+    policy = meta.get("compression", {})
+    previous = {record["name"]: record for record in manifest["entries"]}
+    records = {}
+    candidates = []
+    with log.metrics.phase("scan"):
+        for entry in meta["entries"]:
+            record = _make_record(directory, entry, policy, 0)
+            old = previous.get(entry["name"])
+            if old is not None:
+                record["offset"] = old["offset"]
+                if (old["id"], old["path"], old["size"], old["mtime"]) == (
+                    record["id"],
+                    record["path"],
+                    record["size"],
+                    record["mtime"],
+                ):
+                    record["hash"] = old["hash"]
+                else:
+                    candidates.append(record)
+            else:
+                candidates.append(record)
+            records[entry["name"]] = record
+        _hash_records(directory, candidates, options.workers, pools)
+
+    changed = []
+    for entry in meta["entries"]:
+        record = records[entry["name"]]
+        old = previous.get(entry["name"])
+        if old is None or (old["id"], old["hash"], old.get("compress")) != (
+            record["id"],
+            record["hash"],
+            record["compress"],
+        ):
+            changed.append(entry)
+
+    digests = {record["name"]: record["hash"] for record in manifest["entries"]}
+    with open(archive, "r+b") as archive_fp:
+        updater = Updater(archive_fp, config, digests, log.metrics, log.on_file)
+        offsets = {entry.name: entry.offset for entry in updater.entries}
+        if {name: record["offset"] for name, record in previous.items()} != offsets:
+            return None
+
+        for name in previous:
+            if name not in records:
+                updater.remove_file(name)
+                log.file("Removed file", name, "from c0data.cpk")
+
+        log.start(len(changed))
+        sources = _open_entries(directory, changed, policy, options, False, pools)
+        for source in _timed(log.metrics, "read", sources):
+            record = records[source.entry["name"]]
+            if record["name"] in previous:
+                write = updater.update_file
+            else:
+                write = updater.write_file
+            with source.fp:
+                report = write(
+                    record["id"],
+                    record["name"],
+                    source.fp,
+                    record["hash"],
+                    source.extract_size,
+                )
+            record["offset"] = report.offset
+            log.file(
+                "Updated file", record["id"], ":", record["name"], "in c0data.cpk",
+                f"({_describe(report)} at {report.offset})",
+            )
+        updater.close()
+    log.finish()
+    if config.deduplicate_entries:
+        log.message("Deduplicated", updater.deduplicated_size, "bytes")
+    _report_padding(log, updater.padding)
+    return list(records.values())
+
+
+def _repack(
+    directory: str,
+    archive: str,
+    base: str,
+    meta: Any,
+    options: BuildOptions,
+    log: _Log,
+    pools: Pools | None,
+) -> None:
+    if os.path.exists(archive) and os.path.samefile(base, archive):
+        raise ValueError("cannot repack an archive onto itself")
+
+    with open(base, "rb") as base_fp:
+        reader = Reader(base_fp)
+        try:
+            config = _repack_config(reader.config, meta)
+            overlay = {}
+            for entry in meta.get("entries", []):
+                entry = dict(entry)
+                if "id" not in entry:
+                    try:
+                        entry["id"] = reader.find(entry["name"]).id_
+                    except KeyError:
+                        raise ValueError(f"new file {entry['name']!r} has no id")
+                overlay[entry["name"]] = entry
+            removed = set(meta.get("remove", []))
+
+            items = []
+            for entry in sorted(
+                reader.entries, key=lambda x: (x.offset, x.size > 0, x.id_)
+            ):
+                if entry.name in overlay:
+                    items.append((None, overlay.pop(entry.name)))
+                elif entry.name not in removed:
+                    items.append((entry, None))
+            items.extend((None, entry) for entry in overlay.values())
+
+            log.start(len(items))
+            with open(archive, "wb") as archive_fp:
+                writer = Writer(archive_fp, config, log.metrics, log.on_file)
+                sources = _timed(
+                    log.metrics,
+                    "read",
+                    _open_entries(
+                        directory,
+                        [entry for _, entry in items if entry is not None],
+                        meta.get("compression", {}),
+                        options,
+                        config.deduplicate_entries,
+                        pools,
+                    ),
+                )
+                digests = {}
+                for base_entry, entry in items:
+                    if base_entry is not None:
+                        digest = None
+                        if config.deduplicate_entries:
+                            digest = _base_digest(reader, base_entry, digests)
+                        report = writer.copy_file(
+                            base_entry.id_,
+                            base_entry.name,
+                            base_fp,
+                            base_entry.offset,
+                            base_entry.size,
+                            digest,
+                            base_entry.extract_size,
+                            base_entry.crc,
+                        )
+                        log.file(
+                            "Copied file", report.id_, ":", report.name,
+                            "into c0data.cpk", f"({_describe(report)})",
+                        )
+                        continue
+                    source = next(sources)
+                    with source.fp:
+                        report = writer.write_file(
+                            entry["id"],
+                            entry["name"],
+                            source.fp,
+                            source.digest,
+                            source.extract_size,
+                        )
+                    log.file(
+                        "Wrote file", entry["id"], ":", entry["name"],
+                        "into c0data.cpk", f"({_describe(report)})",
+                    )
+                writer.close()
+        finally:
+            reader.close()
+    log.finish()
+    if config.deduplicate_entries:
+        log.message("Deduplicated", writer.deduplicated_size, "bytes")
+    _report_padding(log, writer.padding)
+
+
+def _repack_config(base: Config, meta: Any) -> Config:
+    return Config(
+        alignment=meta.get("alignment", base.alignment),
+        encrypt_tables=meta.get("encrypt-tables", base.encrypt_tables),
+        randomize_padding=meta.get("randomize-padding", base.randomize_padding),
+        dedupe_tables=meta.get("dedupe-tables", True),
+        share_string_suffixes=meta.get("share-string-suffixes", False),
+        deduplicate_entries=meta.get("deduplicate-entries", base.deduplicate_entries),
+        file_crcs=meta.get("file-crcs", base.file_crcs),
+        padding_seed=meta.get("padding-seed"),
+    )
+
+
+def _base_digest(
+    reader: Reader, entry: Entry, digests: dict[tuple[int, int], str]
+) -> str:
+    key = (entry.offset, entry.size)
+    digest = digests.get(key)
+    if digest is None:
+        with reader.read_entry(entry) as data:
+            digest = digests[key] = hash_bytes(data)
+    return digest
+
+
+def _stream(
+    directory: str,
+    archive: str,
+    config: Config,
+    meta: Any,
+    options: BuildOptions,
+    log: _Log,
+    pools: Pools | None,
+) -> None:
+    with log.metrics.phase("scan"):
+        sources = _measure_entries(
+            directory,
+            meta["entries"],
+            meta.get("compression", {}),
+            options,
+            config.deduplicate_entries,
+            pools,
+        )
+        crcs = [None] * len(sources)
+        if config.file_crcs:
+            with _executors(pools, options.workers, 0) as (executor, _):
+                crcs = list(executor.map(_crc_source, sources))
+    planner = Planner(config, log.metrics)
+    planned = [
+        planner.add_file(
+            source.entry["id"],
+            source.entry["name"],
+            source.size,
+            source.digest,
+            source.extract_size,
+            crc,
+        )
+        for source, crc in zip(sources, crcs)
+    ]
+    plan = planner.finish()
+    log.message(
+        "Planned c0data.cpk:", plan.file_size, "bytes",
+        f"({len(plan.files)} files, {plan.content_size} bytes of content)",
+    )
+    if options.dry_run:
+        return
+
+    log.start(len(planned))
+    if archive == "-":
+        sys.stdout.flush()
+        padding = _stream_into(sys.stdout.buffer, config, plan, sources, planned, log)
+    else:
+        with open(archive, "wb") as archive_fp:
+            padding = _stream_into(archive_fp, config, plan, sources, planned, log)
+    log.finish()
+    if config.deduplicate_entries:
+        log.message("Deduplicated", planner.deduplicated_size, "bytes")
+    _report_padding(log, padding)
+
+
+def _stream_into(
+    archive_fp: BinaryIO,
+    config: Config,
+    plan: Plan,
+    sources: list[_Measured],
+    planned: list[PlannedFile],
+    log: _Log,
+) -> Padder:
+    writer = StreamWriter(archive_fp, config, plan, log.metrics, log.on_file)
+    for source, target in zip(sources, planned):
+        if target.duplicate:
+            report = writer.write_file(target, None)
+        elif source.data is not None:
+            report = writer.write_file(target, BytesIO(source.data))
+            source.data = None
+        else:
+            with open(source.path, "rb") as fp:
+                report = writer.write_file(target, fp)
+        log.file(
+            "Wrote file", target.id_, ":", target.name, "into c0data.cpk",
+            f"({_describe(report)})",
+        )
+    writer.close()
+    return writer.padding
+
+
+def _report_padding(log: _Log, padding: Padder) -> None:
+    if padding.written or padding.skipped:
+        log.message(
+            "Padded", padding.written + padding.skipped, "bytes,",
+            padding.skipped, "of them skipped as holes",
+        )
+
+
+def _order_entries(
+    directory: str, entries: list[dict[str, Any]], layout: dict[str, Any]
+) -> list[dict[str, Any]]:
+    trace = None
+    if "trace" in layout:
+        trace = load_trace(os.path.join(directory, layout["trace"]))
+    by_name = {}
+    for entry in entries:
+        if entry["name"] in by_name:
+            raise ValueError(f"duplicate name: {entry['name']!r}")
+        by_name[entry["name"]] = entry
+    order = order_entries(
+        list(by_name), layout.get("policy"), trace, layout.get("gap", 1.0)
+    )
+    return [by_name[name] for name in order]
+
+
+def _timed(metrics: Metrics, name: str, items: Iterable[Any]) -> Iterator[Any]:
+    iterator = iter(items)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            metrics.add(name, perf_counter() - start)
+        yield item
+
+
+def _describe(report: FileReport) -> str:
+    if report.size != report.extract_size:
+        return f"{report.extract_size} -> {report.size} bytes, {report.method}"
+    return f"{report.size} bytes, {report.method}"
+
+
+def _should_compress(policy: dict[str, Any], entry: dict[str, Any]) -> bool:
+    if "compress" in entry:
+        return entry["compress"]
+    entries = policy.get("entries", {})
+    if entry["name"] in entries:
+        return entries[entry["name"]]
+    path = entry["path"].replace("\\", "/")
+    extensions = policy.get("extensions", {})
+    extension = posixpath.splitext(path)[1].lower()
+    if extension in extensions:
+        return extensions[extension]
+    directories = policy.get("directories", {})
+    directory = posixpath.dirname(path)
+    while directory:
+        if directory in directories:
+            return directories[directory]
+        directory = posixpath.dirname(directory)
+    return policy.get("default", False)
+
+
+def _make_record(
+    directory: str,
+    entry: dict[str, Any],
+    policy: dict[str, Any],
+    offset: int,
+) -> dict[str, Any]:
+    st = os.stat(os.path.join(directory, entry["path"]))
+    return {
+        "id": entry["id"],
+        "name": entry["name"],
+        "path": entry["path"],
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "hash": None,
+        "compress": _should_compress(policy, entry),
+        "offset": offset,
+    }
+
+
+def _hash_records(
+    directory: str, records: list[dict[str, Any]], workers: int, pools: Pools | None
+) -> None:
+    paths = [os.path.join(directory, record["path"]) for record in records]
+    with _executors(pools, workers, 0) as (executor, _):
+        for record, digest in zip(records, executor.map(hash_file, paths)):
+            record["hash"] = digest
+
+
+def _load_manifest(manifest_path: str, archive: str, config: Config) -> Any:
+    if not os.path.exists(manifest_path) or not os.path.exists(archive):
+        return None
+    if os.path.getmtime(manifest_path) < os.path.getmtime(archive):
+        return None
+    manifest = load_json(manifest_path)
+    if manifest.get("config") != _config_json(config):
+        return None
+    return manifest
+
+
+def _remove_manifest(manifest_path: str) -> None:
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+
+def _save_manifest(
+    manifest_path: str, config: Config, records: list[dict[str, Any]]
+) -> None:
+    save_json(manifest_path, {"config": _config_json(config), "entries": records})
+
+
+def _config_json(config: Config) -> dict[str, Any]:
+    return {
+        "alignment": config.alignment,
+        "encrypt-tables": config.encrypt_tables,
+        "randomize-padding": config.randomize_padding,
+        "dedupe-tables": config.dedupe_tables,
+        "share-string-suffixes": config.share_string_suffixes,
+        "deduplicate-entries": config.deduplicate_entries,
+        "file-crcs": config.file_crcs,
+        "padding-seed": config.padding_seed,
+    }
+
+
+def _open_entries(
+    directory: str,
+    entries: list[dict[str, Any]],
+    policy: dict[str, Any],
+    options: BuildOptions,
+    hash_entries: bool,
+    pools: Pools | None,
+) -> Iterator[_Source]:
+    workers = options.workers
+    memory_budget = options.memory_budget
+    compression_workers = options.compression_workers
+    if workers <= 0 and pools is None:
+        for entry in entries:
+            path = os.path.join(directory, entry["path"])
+            if _should_compress(policy, entry):
+                data, digest, extract_size = _compress_entry(path, hash_entries)
+                yield _Source(entry, BytesIO(data), digest, extract_size)
+                continue
+            digest = hash_file(path) if hash_entries else None
+            yield _Source(entry, open(path, "rb"), digest, None)
+        return
+
+    compressing = any(_should_compress(policy, entry) for entry in entries)
+    pending = deque()
+    with _executors(
+        pools, workers, compression_workers if compressing else 0
+    ) as (executor, compressor):
+        try:
+            buffered = 0
+            directs = 0
+            next_index = 0
+            lookahead = max(workers, 1) * 4
+            while next_index < len(entries) or pending:
+                while next_index < len(entries) and len(pending) < lookahead:
+                    entry = entries[next_index]
+                    path = os.path.join(directory, entry["path"])
+                    size = os.path.getsize(path)
+                    compressed = _should_compress(policy, entry)
+                    direct = not compressed and size > min(
+                        memory_budget, options.direct_size
+                    )
+                    if direct:
+                        if directs >= _direct_lookahead:
+                            break
+                        future = executor.submit(_prepare_direct, path, hash_entries)
+                        directs += 1
+                    elif pending and buffered + size > memory_budget:
+                        break
+                    else:
+                        if compressed:
+                            pool: Executor = compressor or executor
+                            future = pool.submit(_compress_entry, path, hash_entries)
+                        else:
+                            future = executor.submit(_load_entry, path, hash_entries)
+                        buffered += size
+                    pending.append((entry, path, size, direct, future))
+                    next_index += 1
+
+                entry, path, size, direct, future = pending.popleft()
+                if direct:
+                    directs -= 1
+                    yield _Source(entry, open(path, "rb"), future.result(), None)
+                else:
+                    data, digest, extract_size = future.result()
+                    yield _Source(entry, BytesIO(data), digest, extract_size)
+                    buffered -= size
+        finally:
+            for *_, future in pending:
+                future.cancel()
+
+
+def _measure_entries(
+    directory: str,
+    entries: list[dict[str, Any]],
+    policy: dict[str, Any],
+    options: BuildOptions,
+    hash_entries: bool,
+    pools: Pools | None,
+) -> list[_Measured]:
+    compression_workers = options.compression_workers
+    if not any(_should_compress(policy, entry) for entry in entries):
+        compression_workers = 0
+    futures = []
+    executors = _executors(pools, options.workers, compression_workers)
+    with executors as (executor, compressor):
+        try:
+            for entry in entries:
+                path = os.path.join(directory, entry["path"])
+                if _should_compress(policy, entry):
+                    pool: Executor = compressor or executor
+                    futures.append(pool.submit(_compress_entry, path, hash_entries))
+                else:
+                    futures.append(executor.submit(_measure_entry, path, hash_entries))
+
+            sources = []
+            for entry, future in zip(entries, futures):
+                path = os.path.join(directory, entry["path"])
+                data, digest, extract_size = future.result()
+                if extract_size is None:
+                    data = None
+                size = os.path.getsize(path) if data is None else len(data)
+                sources.append(_Measured(entry, path, size, digest, extract_size, data))
+            return sources
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+@contextmanager
+def _executors(
+    pools: Pools | None, workers: int, compression_workers: int
+) -> Iterator[tuple[Executor, Executor | None]]:
+    if pools is not None:
+        yield pools.io, pools.compression
+        return
+    executor = ThreadPoolExecutor(max(workers, 1))
+    compressor = None
+    if compression_workers > 0:
+        compressor = ProcessPoolExecutor(compression_workers)
+    try:
+        yield executor, compressor
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if compressor is not None:
+            compressor.shutdown(cancel_futures=True)
+
+
+def _crc_source(source: _Measured) -> int:
+    if source.data is None:
+        return crc32_file(source.path)
+    return zlib.crc32(source.data)
+
+
+def _measure_entry(path: str, hash_entries: bool) -> tuple[None, str | None, None]:
+    return None, hash_file(path) if hash_entries else None, None
+
+
+def _load_entry(path: str, hash_entries: bool) -> tuple[bytes, str | None, None]:
+    data = load_bytes(path)
+    digest = hash_bytes(data) if hash_entries else None
+    return data, digest, None
+
+
+def _compress_entry(
+    path: str, hash_entries: bool
+) -> tuple[bytes, str | None, int | None]:
+    data = load_bytes(path)
+    digest = hash_bytes(data) if hash_entries else None
+    if looks_compressible(data):
+        compressed = compress(data)
+        if compressed is not None:
+            return compressed, digest, len(data)
+    return data, digest, None
+
+
+def _prepare_direct(path: str, hash_entries: bool) -> str | None:
+    if hash_entries:
+        return hash_file(path)
+    _advise_willneed(path)
+    return None
+
+
+def _advise_willneed(path: str) -> None:
+    if not hasattr(os, "posix_fadvise"):
+        return
+    with open(path, "rb") as fp:
+        os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
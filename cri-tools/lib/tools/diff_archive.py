@@ -0,0 +1,15 @@
+from lib.cri.patch import diff
+
+
+def run(old: str, new: str, patch: str) -> None:
+    with open(old, "rb") as old_fp, open(new, "rb") as new_fp:
+        with open(patch, "wb") as patch_fp:
+            report = diff(old_fp, new_fp, patch_fp)
+    print(
+        "Added", report.added, "entries, removed", report.removed,
+        "entries, changed", report.changed, "entries,", report.unchanged, "unchanged",
+    )
+    print(
+        "Copied", report.copied_size, "bytes, stored", report.data_size,
+        "bytes, zero-filled", report.zero_size, "bytes",
+    )
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Any
+
+from lib.cri.cpk import Entry, Reader, copy_fd_range
+from lib.cri.crilayla import decompress_to_file
+from lib.toolutils import save_json
+
+
+def run(archive: str, directory: str, workers: int) -> None:
+    with open(archive, "rb") as archive_fp:
+        reader = Reader(archive_fp)
+        try:
+            entries = sorted(reader.entries, key=lambda x: (x.offset, x.size > 0, x.id_))
+            os.makedirs(directory, exist_ok=True)
+            fd = archive_fp.fileno()
+            with ThreadPoolExecutor(max(workers, 1)) as executor:
+                futures = [
+                    executor.submit(_extract_entry, reader, fd, entry, directory)
+                    for entry in entries
+                ]
+                for entry, future in zip(entries, futures):
+                    method = future.result()
+                    print(
+                        "Extracted file", entry.id_, ":", entry.name,
+                        f"({entry.extract_size} bytes, {method})",
+                    )
+            meta = _make_meta(reader, entries)
+        finally:
+            reader.close()
+    save_json(os.path.join(directory, "_meta.json"), meta)
+
+
+def _make_meta(reader: Reader, entries: list[Entry]) -> dict[str, Any]:
+    config = reader.config
+    meta = {
+        "alignment": config.alignment,
+        "encrypt-tables": config.encrypt_tables,
+        "randomize-padding": config.randomize_padding,
+    }
+    if config.deduplicate_entries:
+        meta["deduplicate-entries"] = True
+    if config.file_crcs:
+        meta["file-crcs"] = True
+    meta["entries"] = []
+    for entry in entries:
+        value = {"name": entry.name, "path": entry.name, "id": entry.id_}
+        if entry.size != entry.extract_size:
+            value["compress"] = True
+        meta["entries"].append(value)
+    return meta
+
+
+def _extract_entry(reader: Reader, src_fd: int, entry: Entry, directory: str) -> str:
+    path = os.path.normpath(os.path.join(directory, entry.name))
+    if os.path.commonpath([path, os.path.normpath(directory)]) != os.path.normpath(
+        directory
+    ):
+        raise ValueError(f"invalid entry name: {entry.name!r}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w+b") as fp:
+        if entry.size != entry.extract_size:
+            decompress_to_file(reader.read_entry(entry), fp)
+            return "crilayla"
+        if entry.size == 0:
+            return "empty"
+
+        dst_fd = fp.fileno()
+        method = copy_fd_range(src_fd, entry.offset, dst_fd, 0, entry.size)
+        if method is not None:
+            return method
+
+        copied = 0
+        with reader.read_entry(entry) as data:
+            if not hasattr(os, "pwrite"):
+                fp.write(data)
+                return "write"
+            while copied < entry.size:
+                copied += os.pwrite(dst_fd, data[copied:], copied)
+        return "pwrite"
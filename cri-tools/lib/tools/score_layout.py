@@ -0,0 +1,22 @@
+from lib.cri.cpk import Reader
+from lib.layout import count_seeks, load_trace
+
+
+def run(archive: str, trace: str, slack: int | None) -> None:
+    accesses = load_trace(trace)
+    with open(archive, "rb") as fp:
+        reader = Reader(fp)
+        try:
+            extents = {entry.name: (entry.offset, entry.size) for entry in reader.entries}
+            if slack is None:
+                slack = reader.alignment
+        finally:
+            reader.close()
+
+    missing = {access.name for access in accesses if access.name not in extents}
+    if missing:
+        print("Ignored", len(missing), "traced names missing from the archive")
+    score = count_seeks(extents, accesses, slack)
+    print("Accesses:", score.accesses)
+    print("Seeks:", score.seeks)
+    print("Seek distance:", score.distance, "bytes")
@@ -0,0 +1,117 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from time import perf_counter
+import zlib
+
+from lib.crcutils import crc32_combine
+from lib.cri.cpk import Reader
+from lib.toolutils import load_json, save_json
+
+
+def run(
+    archive: str,
+    index: str | None,
+    write_index: bool,
+    workers: int,
+    chunk_size: int,
+) -> None:
+    if write_index and index is None:
+        raise ValueError("--write-index requires --index")
+
+    start = perf_counter()
+    with open(archive, "rb") as fp:
+        reader = Reader(fp)
+        try:
+            with ThreadPoolExecutor(max(workers, 1)) as executor:
+                if write_index:
+                    crcs = [
+                        future.result()
+                        for _, future in _submit_chunks(
+                            executor, reader, 0, reader.size, chunk_size
+                        )
+                    ]
+                    save_json(
+                        index,
+                        {"size": reader.size, "chunk-size": chunk_size, "chunks": crcs},
+                    )
+                    print("Wrote", len(crcs), "chunk CRCs into", index)
+                    return
+                if index is not None:
+                    failures = _verify_index(executor, reader, load_json(index))
+                else:
+                    failures = _verify_crcs(executor, reader, chunk_size)
+        finally:
+            reader.close()
+
+    for failure in failures:
+        print("Mismatch:", failure)
+    if failures:
+        raise Exception(f"{len(failures)} checks failed")
+    print("Verified", archive, f"in {perf_counter() - start:.2f} s")
+
+
+def _verify_index(executor: Executor, reader: Reader, index: dict) -> list[str]:
+    if index["size"] != reader.size:
+        return [f"archive size {reader.size}, expected {index['size']}"]
+    chunk_size = index["chunk-size"]
+    chunks = _submit_chunks(executor, reader, 0, reader.size, chunk_size)
+    entries = sorted(reader.entries, key=lambda x: x.offset)
+    failures = []
+    for i, ((length, future), expected) in enumerate(zip(chunks, index["chunks"])):
+        if future.result() == expected:
+            continue
+        start = i * chunk_size
+        end = start + length
+        names = [
+            entry.name
+            for entry in entries
+            if entry.offset < end and entry.offset + entry.size > start
+        ]
+        failure = f"bytes {start}-{end}"
+        if names:
+            failure += " (" + ", ".join(names) + ")"
+        failures.append(failure)
+    return failures
+
+
+def _verify_crcs(executor: Executor, reader: Reader, chunk_size: int) -> list[str]:
+    header = reader.header
+    if not header["EnableFileCrc"]:
+        raise ValueError("archive has no CRCs, verify it against an index instead")
+
+    failures = []
+    for name, crc_column in (("TOC", "TocCrc"), ("ITOC", "ItocCrc")):
+        offset = header[name.capitalize() + "Offset"]
+        size = header[name.capitalize() + "Size"]
+        if _crc_range(reader, offset + 16, size - 16) != header[crc_column]:
+            failures.append(name)
+
+    pending = {}
+    for entry in reader.entries:
+        key = (entry.offset, entry.size)
+        if key not in pending:
+            pending[key] = _submit_chunks(
+                executor, reader, entry.offset, entry.size, chunk_size
+            )
+    for entry in reader.entries:
+        chunks = pending[(entry.offset, entry.size)]
+        crc = 0
+        for length, future in chunks:
+            crc = crc32_combine(crc, future.result(), length)
+        if crc != entry.crc:
+            failures.append(entry.name)
+    return failures
+
+
+def _submit_chunks(
+    executor: Executor, reader: Reader, offset: int, size: int, chunk_size: int
+) -> list[tuple[int, Future]]:
+    chunks = []
+    for start in range(offset, offset + size, chunk_size):
+        length = min(chunk_size, offset + size - start)
+        chunks.append((length, executor.submit(_crc_range, reader, start, length)))
+    return chunks
+
+
+def _crc_range(reader: Reader, offset: int, size: int) -> int:
+    with reader.read_range(offset, size) as data:
+        return zlib.crc32(data)
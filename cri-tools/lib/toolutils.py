@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 from typing import Any
@@ -27,3 +28,16 @@ def save_json(path: str, value: Any) -> None:
 def load_json(path: str) -> Any:
     with open(path, "r", encoding="utf-8-sig") as f:
         return json.load(f)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    buffer = memoryview(bytearray(1024 * 1024))
+    with open(path, "rb") as f:
+        while n := f.readinto(buffer):
+            digest.update(buffer[:n])
+    return digest.hexdigest()
@@ -0,0 +1,15 @@
+from argparse import ArgumentParser
+
+from lib.tools.score_layout import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--archive", required=True)
+    parser.add_argument("--trace", required=True)
+    parser.add_argument("--slack", type=int)
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()
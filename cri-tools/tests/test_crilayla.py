@@ -0,0 +1,38 @@
+import os
+import tempfile
+from threading import Thread
+
+from lib.cri.crilayla import compress, decompress, decompress_to_file
+
+
+def _sample() -> bytes:
+    return b"".join(b"line %d of some repetitive text\n" % (i % 50) for i in range(4000))
+
+
+def test_decompress_to_pipe():
+    data = _sample()
+    compressed = compress(data)
+    assert compressed is not None
+
+    read_fd, write_fd = os.pipe()
+    received = []
+    with open(read_fd, "rb") as reader:
+        thread = Thread(target=lambda: received.append(reader.read()))
+        thread.start()
+        with open(write_fd, "wb") as writer:
+            assert not writer.seekable()
+            assert decompress_to_file(compressed, writer) == len(data)
+        thread.join()
+    assert received == [data]
+
+
+def test_decompress_to_file_at_offset():
+    data = _sample()
+    compressed = compress(data)
+    with tempfile.TemporaryFile() as fp:
+        fp.write(b"prefix")
+        assert decompress_to_file(compressed, fp) == len(data)
+        assert fp.tell() == len(b"prefix") + len(data)
+        fp.seek(0)
+        assert fp.read() == b"prefix" + data
+    assert decompress(compressed) == data
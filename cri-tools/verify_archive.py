@@ -0,0 +1,18 @@
+from argparse import ArgumentParser
+import os
+
+from lib.tools.verify_archive import run
+
+
+def _main():
+    parser = ArgumentParser()
+    parser.add_argument("--archive", required=True)
+    parser.add_argument("--index")
+    parser.add_argument("--write-index", action="store_true")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=8 * 1024 * 1024)
+    args = parser.parse_args()
+    run(**vars(args))
+
+
+_main()